@@ -0,0 +1,46 @@
+"""Time scan.house_robber_line on synthetic lines of growing length.
+
+Run from the project root:
+
+    python -m benchmarks.house_robber
+
+If the scan is linear, the time per syllable in the last column
+stays roughly flat as lines get longer.
+"""
+
+import os
+import random
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "poetry.local_settings")
+django.setup()
+
+from scansion.scan import house_robber_line
+
+LENGTHS = [10, 100, 1000, 10000, 100000]
+
+def make_line(syllables, seed=0):
+    """Make poem_stats-style line with words of 1-3 syllables"""
+    rng = random.Random(seed)
+    line = []
+    count = 0
+    while count < syllables:
+        for i in range(rng.randint(1, 3)):
+            line.append("?" if rng.random() < 0.1 else round(rng.uniform(0.01, 8), 4))
+            count += 1
+        line.append(" ")
+    return line
+
+def main():
+    print(f"{'syllables':>10} {'ms per line':>12} {'us per syllable':>16}")
+    for length in LENGTHS:
+        line = make_line(length)
+        syllables = sum(1 for value in line if value != " ")
+        number = max(1, 100000 // length)
+        best = min(timeit.repeat(lambda: house_robber_line(line), number=number, repeat=5)) / number
+        print(f"{syllables:>10} {best * 1000:>12.3f} {best * 1e6 / syllables:>16.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Time the scanning and lexicon hot paths against a synthetic lexicon.
+
+Run from the project root:
+
+    python -m benchmarks.suite --sizes 10000 100000 --output results.json
+
+Everything runs in a throwaway test database filled with a generated
+lexicon of each size, so results do not depend on local data. Output
+is JSON: for each lexicon size and benchmark, the best and mean time
+of a call in seconds and the queries one call makes. Compare files
+from different commits to spot regressions.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import django
+from asgiref.sync import async_to_sync
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "poetry.local_settings")
+django.setup()
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from scansion import contexts, estimator, lexicon, parse, scan, views
+from scansion.models import User, Word, StressPattern, Poem, Algorithm, HumanScansion
+
+SIZES = [10000]
+LINE_COUNTS = [14, 100, 1000]
+# share of words in generated poems that are not in the lexicon
+UNKNOWN_SHARE = 0.1
+
+ONSETS = ["", "b", "br", "c", "ch", "d", "f", "g", "gr", "h", "l", "m", "n", "p", "r", "s", "st", "t", "th", "w"]
+NUCLEI = ["a", "e", "i", "o", "u", "ai", "ea", "oo", "ou"]
+CODAS = ["", "", "d", "l", "m", "n", "r", "s", "t", "ng", "st"]
+# share of words with 1, 2, 3 and 4 syllables, roughly as in English verse
+SYLLABLE_WEIGHTS = [0.6, 0.28, 0.09, 0.03]
+
+def make_word(rng, syllables):
+    """Make a pronounceable pseudo-word with some number of syllables"""
+    return "".join(rng.choice(ONSETS) + rng.choice(NUCLEI) + rng.choice(CODAS) for i in range(syllables))
+
+def make_patterns(rng, syllables):
+    """Make stress patterns and popularities for a word, most popular first
+
+    Most words have one dominant pattern with a long tail of rarer
+    ones, a few of which have the wrong number of syllables.
+    """
+    dominant = "".join(rng.choice(parse.STRESSED + parse.UNSTRESSED) for i in range(syllables))
+    patterns = {dominant: int(rng.paretovariate(1.2) * 3)}
+    for i in range(rng.choice([0, 0, 0, 1, 1, 2])):
+        length = syllables if rng.random() < 0.8 else max(1, syllables + rng.choice([-1, 1]))
+        stresses = "".join(rng.choice(parse.STRESSED + parse.UNSTRESSED) for i in range(length))
+        patterns.setdefault(stresses, rng.randint(1, 3))
+    return patterns
+
+def make_lexicon(size, seed=0):
+    """Fill the Word and StressPattern tables with size synthetic words
+
+    Returns
+    -------
+    vocabulary : list of str
+        the words, most popular first
+    """
+    rng = random.Random(seed)
+    vocabulary = {}
+    while len(vocabulary) < size:
+        syllables = rng.choices(range(1, 5), SYLLABLE_WEIGHTS)[0]
+        word = make_word(rng, syllables)
+        if word not in vocabulary:
+            vocabulary[word] = make_patterns(rng, syllables)
+    words = list(vocabulary)
+    for i in range(0, len(words), lexicon.BATCH_SIZE):
+        batch = words[i:i + lexicon.BATCH_SIZE]
+        Word.objects.bulk_create([Word(word=word, lexicon_version=1) for word in batch])
+        instances = list(Word.objects.filter(word__in=batch))
+        patterns = []
+        for w in instances:
+            word_patterns = [StressPattern(word=w, stresses=stresses, popularity=popularity)
+                             for stresses, popularity in vocabulary[w.word].items()]
+            count, tallies = parse.stress_tallies(word_patterns)
+            w.dominant_syllables = count
+            w.stress_tallies = parse.encode_tallies(tallies)
+            patterns.extend(word_patterns)
+        StressPattern.objects.bulk_create(patterns)
+        Word.objects.bulk_update(instances, ["dominant_syllables", "stress_tallies"])
+    words.sort(key=lambda word: -sum(vocabulary[word].values()))
+    return words
+
+def make_poem(rng, vocabulary, lines, words_per_line=8):
+    """Make a poem of four-line stanzas, words drawn with a Zipf-like skew"""
+    stanzas = []
+    for start in range(0, lines, 4):
+        stanza = []
+        for i in range(min(4, lines - start)):
+            line = []
+            for j in range(words_per_line):
+                if rng.random() < UNKNOWN_SHARE:
+                    line.append(make_word(rng, rng.choices(range(1, 5), SYLLABLE_WEIGHTS)[0]) + "x")
+                else:
+                    rank = min(int(rng.paretovariate(1.0)) - 1, len(vocabulary) - 1)
+                    line.append(vocabulary[rank])
+            stanza.append(" ".join(line))
+        stanzas.append("\n".join(stanza))
+    return "\n\n".join(stanzas)
+
+def measure(function, repeat=5, number=1):
+    """Time function and count the queries one call makes
+
+    Returns
+    -------
+    result : dict
+        best and mean seconds per call and queries per call
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        times = [t / number for t in timeit.repeat(function, number=number, repeat=repeat)]
+    return {"best": min(times), "mean": sum(times) / len(times), "queries": len(queries)}
+
+def file_caches_in(directory):
+    """Return CACHES with every file-based cache moved into directory
+
+    The benchmarks clear and fill the caches, which must not touch
+    the ones a development server is using.
+    """
+    return {alias: dict(config, LOCATION=os.path.join(directory, alias))
+            if config["BACKEND"].endswith("FileBasedCache") else config
+            for alias, config in settings.CACHES.items()}
+
+def run_size(size, seed=0):
+    """Run every benchmark against a fresh lexicon of size words"""
+    # start from empty tables; patterns protect their words from deletion,
+    # and go in raw SQL so their words are not each rebuilt on the way out
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {StressPattern._meta.db_table}")
+    Word.objects.all().delete()
+    Poem.objects.all().delete()
+    User.objects.all().delete()
+    lexicon.invalidate()
+    cache.clear()
+    rng = random.Random(seed)
+    results = {}
+
+    vocabulary = make_lexicon(size, seed)
+
+    def load():
+        lexicon.invalidate()
+        lexicon.get_lexicon()
+    results["lexicon_load"] = measure(load, repeat=3)
+
+    unknown = [make_word(rng, 3) + "x" for i in range(1000)]
+    results["get_stats"] = measure(lambda: scan.get_stats(rng.choice(vocabulary)), number=100)
+    results["get_stats_unknown"] = measure(lambda: scan.get_stats(rng.choice(unknown)), number=100)
+
+    def syllables_cold():
+        estimator._estimate_cleaned.cache_clear()
+        for word in unknown:
+            scan.syllables(word)
+    results["syllables_cold_1000"] = measure(syllables_cold)
+    results["syllables_warm_1000"] = measure(lambda: [scan.syllables(word) for word in unknown])
+
+    for lines in LINE_COUNTS:
+        poem = make_poem(rng, vocabulary, lines)
+        results[f"poem_stats_{lines}"] = measure(lambda: scan.poem_stats(poem))
+        for name, function in views.ALGORITHMS.items():
+            results[f"{name}_{lines}"] = measure(lambda: function(poem))
+
+    poem_text = make_poem(rng, vocabulary, 14)
+    scansion = scan.simple_scan(poem_text)
+    results["record_14"] = measure(lambda: scan.record(poem_text, scansion))
+
+    poem = Poem.objects.create(poem=poem_text)
+    users = [User.objects.create_user(f"user{i}", password="x") for i in range(5)]
+    for user in users:
+        HumanScansion.objects.create(poem=poem, user=user, scansion=scan.house_robber_scan(poem_text))
+    lines = poem_text.splitlines()
+    diffs = [(str(i), "0") for i, line in enumerate(lines) if line]
+    results["reconcile_14"] = measure(lambda: scan.reconcile(scansion, poem, diffs))
+
+    for name in views.ALGORITHMS:
+        Algorithm.objects.get_or_create(name=name)
+    generate_context = async_to_sync(views.generate_context_async)
+    generate_context(poem, True)
+    results["generate_context_14"] = measure(lambda: (contexts.clear(), generate_context(poem, True)))
+    results["generate_context_cached_14"] = measure(lambda: generate_context(poem, True))
+    return results
+
+def git_commit():
+    """Return the checked out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="lexicon sizes to try")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file for the JSON results; printed if left out")
+    args = parser.parse_args()
+
+    # migrating the test database already sends signals that touch the caches
+    with tempfile.TemporaryDirectory() as directory, override_settings(CACHES=file_caches_in(directory)):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            runs = {}
+            for size in args.sizes:
+                print(f"lexicon of {size} words...", file=sys.stderr)
+                runs[str(size)] = run_size(size, args.seed)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": runs,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ScansionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scansion'
+
+    def ready(self):
+        from . import signals
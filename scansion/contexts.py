@@ -0,0 +1,69 @@
+"""MODULE CONTEXTS
+===============
+This module caches the serialized frontend context of each poem in
+the "contexts" cache, which every worker process shares, so popular
+poems are not rebuilt from the database on every request.
+
+Only the poem and its scansions are cached. The poet and poem menus,
+the one part that depends on the user class, come from the navigation
+cache, so one entry serves every user. Each entry holds the content
+version (see views.content_version) it was built for, and an entry
+for another version counts as a miss. Signals evict a poem's entry
+when its text or human scansions change, and every entry when the
+algorithms do.
+
+Functions
+---------
+get(poem_id, version) : Return cached serialized context, or None.
+put(poem_id, version, serialized) : Cache serialized context.
+evict(poem_id) : Forget a poem's cached context.
+clear() : Forget every cached context.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+CACHE_ALIAS = "contexts"
+
+def _cache():
+    """Return the contexts cache, or the default one if none is configured"""
+    return caches[CACHE_ALIAS if CACHE_ALIAS in settings.CACHES else "default"]
+
+def _key(poem_id):
+    return f"context:{poem_id}"
+
+def get(poem_id, version):
+    """Return the JSON context cached for poem_id, if built for version
+
+    Parameters
+    ----------
+    poem_id : int
+        poem's pk
+    version : str
+        content version the context must have been built for
+
+    Returns
+    -------
+    serialized : str or None
+        JSON context, or None on a miss
+    """
+    entry = _cache().get(_key(poem_id))
+    if entry is not None and entry[0] == version:
+        metrics.CONTEXT_CACHE.inc(result="hit")
+        return entry[1]
+    metrics.CONTEXT_CACHE.inc(result="miss")
+    return None
+
+def put(poem_id, version, serialized):
+    """Cache JSON context of poem_id, built for version"""
+    _cache().set(_key(poem_id), (version, serialized), None)
+
+def evict(poem_id):
+    """Forget a poem's cached context"""
+    _cache().delete(_key(poem_id))
+
+def clear():
+    """Forget every cached context"""
+    _cache().clear()
@@ -0,0 +1,170 @@
+"""MODULE ENGINE
+=============
+This module runs the scan algorithms as NumPy array operations over
+whole poems, or many poems at once, for bulk rescans.
+
+Each line of poem_stats output becomes a row of a padded float matrix
+with one column per syllable: NaN stands for `?`, a mask marks the
+syllables that end words, and each row's length marks where padding
+starts. Output is identical to the functions in scan.py. Without NumPy,
+scan_poems falls back to calling those functions poem by poem.
+
+Functions
+---------
+pack(stats_lines) : Turn poem_stats lines into a StatsMatrix.
+simple(matrix) : Symbols for simple_scan.
+original(matrix) : Symbols for original_scan.
+house_robber(matrix) : Symbols for house_robber_scan.
+render(matrix, symbols) : Turn symbols back into scansion lines.
+scan_poems(poems, algorithms, tokens=None) : Scan many poems with many algorithms.
+"""
+
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import parse
+from . import scan
+
+# poems scanned together; bounds memory of the padded matrix
+CHUNK_SIZE = 200
+
+# values: float rows of stress ratios, NaN for `?` and padding
+# lengths: number of syllables in each row
+# word_end: True where a syllable is the last of its word
+StatsMatrix = namedtuple("StatsMatrix", ["values", "lengths", "word_end"])
+
+def pack(stats_lines):
+    """Turn lines of poem_stats output into a StatsMatrix"""
+    rows = [[value for value in line if value != " "] for line in stats_lines]
+    lengths = np.array([len(row) for row in rows], dtype=int)
+    width = int(lengths.max()) if len(rows) else 0
+    values = np.full((len(rows), width), np.nan)
+    word_end = np.zeros((len(rows), width), dtype=bool)
+    for r, line in enumerate(stats_lines):
+        j = 0
+        for value in line:
+            if value == " ":
+                word_end[r, j - 1] = True
+            else:
+                if value != "?":
+                    values[r, j] = value
+                j += 1
+    return StatsMatrix(values, lengths, word_end)
+
+def _in_line(matrix):
+    """Mask of cells holding syllables rather than padding"""
+    return np.arange(matrix.values.shape[1]) < matrix.lengths[:, None]
+
+def simple(matrix):
+    """Symbols for simple_scan: stressed when the ratio is above 1"""
+    values = matrix.values
+    with np.errstate(invalid="ignore"):
+        symbols = np.where(values > 1, parse.STRESSED, parse.UNSTRESSED)
+    return np.where(np.isnan(values), parse.UNKNOWN, symbols)
+
+def original(matrix):
+    """Symbols for original_scan: compare each ratio to the next one
+
+    The last syllable of a line is compared to the one before it,
+    and a line's only syllable to itself.
+    """
+    values = matrix.values
+    rows = np.arange(len(values))
+    neighbours = np.full(values.shape, np.nan)
+    neighbours[:, :-1] = values[:, 1:]
+    last = matrix.lengths - 1
+    has_syllables = last >= 0
+    before_last = np.maximum(last - 1, 0)
+    neighbours[rows[has_syllables], last[has_syllables]] = values[rows[has_syllables], before_last[has_syllables]]
+
+    with np.errstate(invalid="ignore"):
+        # if the neighbour is unknown, guess based on the value alone
+        alone = np.where(values < 0.2, parse.UNSTRESSED,
+                         np.where(values >= 1.0, parse.STRESSED, parse.UNKNOWN))
+        compared = np.where(values < neighbours, parse.UNSTRESSED,
+                            np.where(values > neighbours, parse.STRESSED, parse.UNKNOWN))
+    symbols = np.where(np.isnan(neighbours), alone, compared)
+    return np.where(np.isnan(values), parse.UNKNOWN, symbols)
+
+def house_robber(matrix):
+    """Symbols for house_robber_scan, running every line's DP at once"""
+    values = np.where(np.isnan(matrix.values), 0.3, matrix.values)
+    in_line = _in_line(matrix)
+    count, width = values.shape
+    prev1 = np.zeros(count)
+    prev2 = np.zeros(count)
+    took = np.zeros((count, width), dtype=bool)
+    for j in range(width):
+        active = in_line[:, j]
+        take = active & (prev1 <= prev2 + values[:, j])
+        took[:, j] = take
+        new1 = np.where(take, prev2 + values[:, j], prev1)
+        prev2 = np.where(active, prev1, prev2)
+        prev1 = new1
+    # walk back from each line's last syllable through its winning pattern
+    stressed = np.zeros((count, width), dtype=bool)
+    rows = np.arange(count)
+    position = matrix.lengths - 1
+    walking = position >= 0
+    while walking.any():
+        r = rows[walking]
+        t = took[r, position[r]]
+        stressed[r, position[r]] = t
+        position[r] = np.where(t, position[r] - 2, position[r] - 1)
+        walking = position >= 0
+    return np.where(stressed, parse.STRESSED, parse.UNSTRESSED)
+
+def render(matrix, symbols):
+    """Turn a symbol array back into scansion lines, words separated by spaces"""
+    spaced = np.char.add(symbols.astype("<U1"), np.where(matrix.word_end, " ", ""))
+    return ["".join(row[:length]) for row, length in zip(spaced.tolist(), matrix.lengths.tolist())]
+
+# vectorized versions of the scan functions in scan.py
+VECTORIZED = {
+    scan.simple_scan: simple,
+    scan.simple_scan_augmented: simple,
+    scan.original_scan: original,
+    scan.house_robber_scan: house_robber,
+}
+
+def scan_poems(poems, algorithms, tokens=None):
+    """Scan many poems with many algorithms, sharing one stats pass
+
+    Parameters
+    ----------
+    poems : list of str
+        poems to scan
+    algorithms : dict
+        algorithm names mapped to scan functions, like views.ALGORITHMS
+    tokens : list, optional
+        parse.tokenize output for each poem, if already at hand
+
+    Returns
+    -------
+    scansions : list of dicts
+        for each poem, algorithm names mapped to scansions,
+        exactly as the scan functions would return them
+    """
+    if np is None:
+        return [{name: function(poem) for name, function in algorithms.items()} for poem in poems]
+    results = [{} for poem in poems]
+    for start in range(0, len(poems), CHUNK_SIZE):
+        chunk = poems[start:start + CHUNK_SIZE]
+        chunk_tokens = tokens[start:start + CHUNK_SIZE] if tokens else [None] * len(chunk)
+        stats = [scan.poem_stats(poem, t) for poem, t in zip(chunk, chunk_tokens)]
+        matrix = pack([line for poem in stats for line in poem])
+        for name, function in algorithms.items():
+            if function in VECTORIZED:
+                lines = render(matrix, VECTORIZED[function](matrix))
+                first = 0
+                for i, poem in enumerate(stats):
+                    results[start + i][name] = "\n".join(lines[first:first + len(poem)])
+                    first += len(poem)
+            else:
+                for i, poem in enumerate(chunk):
+                    results[start + i][name] = function(poem)
+    return results
@@ -0,0 +1,61 @@
+"""MODULE ESTIMATOR
+================
+This module guesses syllable counts of words not in the database,
+remembering recent answers since unknown words recur across poems.
+
+Functions
+---------
+estimate(word) : Guess syllable count of a word.
+syllables_many(words) : Guess syllable counts of many words.
+"""
+
+from functools import lru_cache
+
+from . import parse
+
+# distinct cleaned words whose counts are remembered
+CACHE_SIZE = 20000
+
+def estimate(word):
+    """Guess syllable count of word not in database.
+
+    Parameters
+    ----------
+    word : str
+        word not found in database, cleaned or not
+
+    Returns
+    -------
+    count : int
+        estimated number of syllables
+
+    See also
+    --------
+    tests/test_scan.py to clarify regular expressions
+    """
+    return _estimate_cleaned(parse.clean(word))
+
+def syllables_many(words):
+    """Guess syllable counts of many words, in order"""
+    return [_estimate_cleaned(parse.clean(word)) for word in words]
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _estimate_cleaned(cleaned_word):
+    """Guess syllable count of a word already cleaned with parse.clean()"""
+    compound = cleaned_word.split("-")
+    total_count = 0
+    for w in compound:
+        # get preliminary count by counting vowels or clusters thereof
+        count = parse.preliminary_syllable_count(w)
+        # increment count for all vowel clusters likely to be 2 syllables
+        count += parse.adjustment_for_two_syll_clusters(w)
+        # subtract 1 for every likely silent e
+        if parse.silent_final_e(w):
+            count -= 1
+        if parse.other_silent_e(w):
+            count -= 1
+        # words have at least one syllable
+        if count <= 0:
+            count = 1
+        total_count += count
+    return total_count
@@ -0,0 +1,175 @@
+"""MODULE LEXICON
+==============
+This module keeps an in-process snapshot of the word data scan.py needs,
+so that scanning a poem does not touch the database.
+
+Classes
+-------
+Lexicon : Map cleaned words to stress ratios or syllable counts.
+
+Functions
+---------
+fetch(words) : Read snapshot entries for words from the database.
+load() : Read the whole lexicon from the database.
+current_version() : Return version of the lexicon in the database.
+next_version() : Claim a new version for words about to change.
+get_lexicon(version=None) : Return this process's snapshot, loading it if needed.
+refresh(words) : Reread words into the snapshot after they change.
+store(word_instances) : Put freshly saved Words into the snapshot.
+invalidate() : Drop the snapshot so the next scan reloads it.
+"""
+
+from threading import Lock
+
+from django.db.models import F, Max, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import BATCH_SIZE, Word, LexiconVersion
+
+class Lexicon:
+    """Snapshot of the lexicon, built once and updated in place.
+
+    Each entry is either a tuple of stress ratios (one per syllable,
+    as parse.calculate_ratios returns them) for words with stress
+    patterns, or an int syllable count for words known only from the
+    dictionary. Words with neither are left out. version is the
+    lexicon version the snapshot has caught up to.
+    """
+    def __init__(self, entries=None, version=0):
+        self.entries = entries or {}
+        self.version = version
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, word):
+        return word in self.entries
+
+    def stats(self, word):
+        """Return get_stats-style list for word, or None if unknown"""
+        entry = self.entries.get(word)
+        if entry is None:
+            return None
+        elif isinstance(entry, tuple):
+            return list(entry)
+        else:
+            return ["?" for i in range(entry)]
+
+    def update(self, entries):
+        """Replace entries; words mapped to None are removed"""
+        for word, entry in entries.items():
+            if entry is None:
+                self.entries.pop(word, None)
+            else:
+                self.entries[word] = entry
+
+def make_entry(word_instance):
+    """Make snapshot entry for a Word from its stored stress tallies"""
+    if word_instance.stress_tallies:
+        return tuple(word_instance.stress_ratios())
+    elif word_instance.syllables:
+        return word_instance.syllables
+    else:
+        return None
+
+# Word fields the snapshot is made from
+FIELDS = ("word", "syllables", "stress_tallies", "lexicon_version")
+
+def fetch(words):
+    """Read snapshot entries for words from the Word table.
+
+    Parameters
+    ----------
+    words : iterable of str
+        cleaned words to read
+
+    Returns
+    -------
+    entries : dict
+        each word mapped to its entry, or to None if it has none
+    """
+    distinct = list(set(words))
+    entries = {word: None for word in distinct}
+    for i in range(0, len(distinct), BATCH_SIZE):
+        batch = distinct[i:i + BATCH_SIZE]
+        for word_instance in Word.objects.filter(word__in=batch).only(*FIELDS):
+            entries[word_instance.word] = make_entry(word_instance)
+    return entries
+
+def load():
+    """Read the whole Word table into a new Lexicon"""
+    entries = {}
+    version = 0
+    for word_instance in Word.objects.only(*FIELDS).iterator():
+        entry = make_entry(word_instance)
+        if entry is not None:
+            entries[word_instance.word] = entry
+        version = max(version, word_instance.lexicon_version)
+    return Lexicon(entries, version)
+
+_lexicon = None
+_lock = Lock()
+
+def current_version():
+    """Return lexicon version: the latest version at which any Word changed"""
+    return Word.objects.aggregate(version=Max("lexicon_version"))["version"] or 0
+
+def next_version():
+    """Claim a new lexicon version for words about to change
+
+    Call it first thing in the transaction that changes them. Bumping
+    the counter row locks it until that transaction ends (on SQLite it
+    takes the database's write lock), so writers of the lexicon run one
+    at a time, their versions commit in order, and get_lexicon never
+    skips a word.
+    """
+    # words may carry versions the counter never handed out, as when
+    # loaded in bulk, so go past the latest of those too
+    latest = Coalesce(Subquery(Word.objects.order_by("-lexicon_version").values("lexicon_version")[:1]), 0)
+    bump = {"number": Greatest(F("number"), latest) + 1}
+    if not LexiconVersion.objects.filter(pk=1).update(**bump):
+        LexiconVersion.objects.get_or_create(pk=1)
+        LexiconVersion.objects.filter(pk=1).update(**bump)
+    return LexiconVersion.objects.get(pk=1).number
+
+def get_lexicon(version=None):
+    """Return this process's lexicon snapshot, loading it the first time
+
+    Parameters
+    ----------
+    version : int, optional
+        lexicon version from current_version(); if given, first bring
+        the snapshot up to it by rereading the words changed since,
+        which also picks up changes recorded by other processes
+    """
+    global _lexicon
+    with _lock:
+        if _lexicon is None:
+            _lexicon = load()
+        elif version is None or version == _lexicon.version:
+            pass
+        elif version < _lexicon.version:
+            # the database went back in time (restored or rolled back)
+            _lexicon = load()
+        else:
+            changed = Word.objects.filter(lexicon_version__gt=_lexicon.version).only(*FIELDS)
+            _lexicon.update({w.word: make_entry(w) for w in changed})
+            _lexicon.version = version
+    return _lexicon
+
+def refresh(words):
+    """Reread words from the database into the snapshot, if it is loaded"""
+    lexicon = _lexicon
+    if lexicon is not None:
+        lexicon.update(fetch(words))
+
+def store(word_instances):
+    """Put Words just saved into the snapshot, if it is loaded"""
+    lexicon = _lexicon
+    if lexicon is not None:
+        lexicon.update({w.word: make_entry(w) for w in word_instances})
+
+def invalidate():
+    """Drop the snapshot; the next call to get_lexicon reloads it"""
+    global _lexicon
+    _lexicon = None
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scansion import lexicon
+from scansion import parse
+from scansion.models import Word, StressPattern
+
+BATCH_SIZE = 500
+
+class Command(BaseCommand):
+    help = "Check Words' stored stress tallies against their StressPatterns"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="rewrite tallies that do not match")
+
+    def handle(self, *args, **options):
+        ids = list(Word.objects.order_by("pk").values_list("pk", flat=True))
+        mismatched = 0
+        for i in range(0, len(ids), BATCH_SIZE):
+            with transaction.atomic():
+                stale = self.check_batch(ids[i:i + BATCH_SIZE], options["rebuild"])
+            mismatched += len(stale)
+            if options["rebuild"]:
+                lexicon.store(stale)
+        if options["rebuild"]:
+            self.stdout.write(f"Rebuilt tallies for {mismatched} of {len(ids)} words")
+        else:
+            self.stdout.write(f"{mismatched} of {len(ids)} words have stale tallies")
+
+    def check_batch(self, batch, rebuild):
+        """Report words in batch with stale tallies, rebuilding them if asked
+
+        Returns the words with stale tallies, corrected.
+        """
+        if rebuild:
+            # first, so that scan.record waits rather than changing
+            # patterns between reading and rewriting them
+            version = lexicon.next_version()
+        patterns = {}
+        for pattern in StressPattern.objects.filter(word_id__in=batch).order_by("pk"):
+            patterns.setdefault(pattern.word_id, []).append(pattern)
+        stale = []
+        for word in Word.objects.filter(pk__in=batch):
+            count, tallies = parse.stress_tallies(patterns.get(word.pk, []))
+            encoded = parse.encode_tallies(tallies)
+            if word.dominant_syllables != count or word.stress_tallies != encoded:
+                self.stdout.write(f"{word.word}: stored {word.dominant_syllables} "
+                                  f"'{word.stress_tallies}', expected {count} '{encoded}'")
+                word.dominant_syllables = count
+                word.stress_tallies = encoded
+                stale.append(word)
+        if rebuild and stale:
+            # a new lexicon version, so snapshots reread the words and
+            # scansions made from the corrupt tallies go stale
+            for word in stale:
+                word.lexicon_version = version
+            Word.objects.bulk_update(stale, ["dominant_syllables", "stress_tallies", "lexicon_version"])
+        return stale
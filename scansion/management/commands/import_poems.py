@@ -0,0 +1,154 @@
+import json
+import re
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from scansion import engine
+from scansion import lexicon
+from scansion import navigation
+from scansion import random_poems
+from scansion import scan
+from scansion.models import Poet, Poem, PoemWord, Algorithm, MachineScansion
+
+BATCH_SIZE = 1000
+
+# in plain text files, a line holding only this ends a poem
+DELIMITER = "%"
+# optional header lines at the top of a poem in plain text files
+HEADER = re.compile(r"^(title|poet):\s*(.*)$", re.IGNORECASE)
+
+def split_name(name):
+    """Split "First Last" into (first_name, last_name)"""
+    first, _, last = name.strip().rpartition(" ")
+    return first, last
+
+def read_text(f):
+    """Yield poems from a plain text file one at a time
+
+    Poems are separated by lines holding only `%`. A poem may start
+    with `Title: ...` and `Poet: First Last` lines.
+    """
+    def record(lines):
+        fields = {}
+        while lines and HEADER.match(lines[0]):
+            key, value = HEADER.match(lines.pop(0)).groups()
+            fields[key.lower()] = value.strip()
+        poem = "\n".join(lines).strip("\n")
+        if poem.strip():
+            fields["poem"] = poem
+            return fields
+
+    lines = []
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line.strip() == DELIMITER:
+            fields = record(lines)
+            if fields:
+                yield fields
+            lines = []
+        else:
+            lines.append(line)
+    fields = record(lines)
+    if fields:
+        yield fields
+
+def read_jsonl(f):
+    """Yield poems from a JSONL file, one object per line
+
+    Each object needs a "poem" and may have "title" and "poet"
+    ("First Last"), or "first_name" and "last_name".
+    """
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise CommandError(f"line {number}: {e}")
+        if not fields.get("poem"):
+            raise CommandError(f"line {number}: no poem")
+        yield fields
+
+class Command(BaseCommand):
+    help = "Import poems from plain text or JSONL files in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="files to import")
+        parser.add_argument("--format", choices=["text", "jsonl"],
+                            help="file format; guessed from the extension if left out")
+        parser.add_argument("--poet", help="poet (\"First Last\") of poems that name none")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--scan", action="store_true",
+                            help="store machine scansions of the new poems too")
+
+    def handle(self, *args, **options):
+        # every poet, by (first name, last name), so poems never look one up
+        self.poets = {(p.first_name, p.last_name): p for p in Poet.objects.all()}
+        self.default_poet = split_name(options["poet"]) if options["poet"] else None
+        if options["scan"]:
+            self.algorithms = list(Algorithm.objects.all())
+            self.version = lexicon.current_version()
+            lexicon.get_lexicon(self.version)
+
+        start = time.time()
+        total = 0
+        for path in options["files"]:
+            file_format = options["format"] or ("jsonl" if path.endswith((".jsonl", ".json")) else "text")
+            with open(path, encoding="utf-8") as f:
+                records = read_jsonl(f) if file_format == "jsonl" else read_text(f)
+                while True:
+                    batch = list(islice(records, options["batch_size"]))
+                    if not batch:
+                        break
+                    self.import_batch(batch, options["scan"])
+                    total += len(batch)
+                    self.stdout.write(f"{total} poems ({time.time() - start:.1f}s)")
+        # bulk_create sends no signals
+        navigation.invalidate()
+        random_poems.invalidate()
+        self.stdout.write(f"Imported {total} poems in {time.time() - start:.1f}s")
+
+    def get_poet(self, fields):
+        """Return Poet for a record, creating it the first time it is named"""
+        if fields.get("last_name"):
+            name = (fields.get("first_name", ""), fields["last_name"])
+        elif fields.get("poet"):
+            name = split_name(fields["poet"])
+        elif self.default_poet:
+            name = self.default_poet
+        else:
+            return None
+        if name not in self.poets:
+            self.poets[name] = Poet.objects.create(first_name=name[0], last_name=name[1])
+        return self.poets[name]
+
+    def import_batch(self, batch, scan_poems):
+        """Insert one batch of poems, with their scansions if asked"""
+        poems = [Poem(title=fields.get("title", ""), poet=self.get_poet(fields), poem=fields["poem"])
+                 for fields in batch]
+        # bulk_create skips save, which fills these in
+        for poem in poems:
+            poem.set_tokens()
+            poem.display_title = poem.get_display_title()
+        with transaction.atomic():
+            Poem.objects.bulk_create(poems)
+            if poems[-1].pk is None:
+                # backends that do not return keys from bulk inserts;
+                # inside the transaction these are the newest rows
+                pks = Poem.objects.order_by("-pk").values_list("pk", flat=True)[:len(poems)]
+                for poem, pk in zip(poems, reversed(list(pks))):
+                    poem.pk = pk
+            PoemWord.objects.bulk_create([word for poem in poems for word in poem.word_occurrences()])
+            if scan_poems:
+                to_scan = {algorithm.name: scan.ALGORITHMS[algorithm.name] for algorithm in self.algorithms}
+                results = engine.scan_poems([poem.poem for poem in poems], to_scan,
+                                            [poem.get_tokens() for poem in poems])
+                MachineScansion.objects.bulk_create([
+                    MachineScansion(poem=poem, algorithm=algorithm, scansion=scansions[algorithm.name],
+                                    poem_hash=poem.get_hash(), lexicon_version=self.version)
+                    for poem, scansions in zip(poems, results)
+                    for algorithm in self.algorithms
+                ])
@@ -0,0 +1,185 @@
+import json
+import multiprocessing
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+# this module must not import models at the top: workers started with
+# "spawn" or "forkserver" import it before Django is set up
+
+CHECKPOINT = settings.BASE_DIR / "rescan_checkpoint.json"
+# held by a running rescan, with its pid inside
+LOCK = settings.BASE_DIR / "rescan.lock"
+
+def acquire_lock(path=LOCK):
+    """Lock path for this rescan, returning the open file, or None if held
+
+    The operating system releases the lock when the process ends, so a
+    rescan that dies never leaves it behind. Without fcntl (Windows)
+    nothing is locked.
+    """
+    f = open(path, "a+")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+def is_running(path=LOCK):
+    """Return True if a rescan holds the lock at path"""
+    if fcntl is None or not os.path.exists(path):
+        return False
+    with open(path) as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+    return False
+
+def init_worker():
+    """Ready a pool process: Django set up, own connection, lexicon loaded"""
+    if not django.apps.apps.ready:
+        django.setup()
+    from scansion import lexicon
+    # never share the parent's database connection
+    connections.close_all()
+    lexicon.get_lexicon()
+
+def scan_chunk(args):
+    """Scan a chunk of poems with the engine
+
+    Parameters
+    ----------
+    args : tuple
+        list of poem ids and list of algorithm names
+
+    Returns
+    -------
+    results : list
+        (poem id, Poem.get_hash(), {algorithm name: scansion}) for each poem
+    """
+    from scansion import engine, scan
+    from scansion.models import Poem
+    ids, names = args
+    poems = list(Poem.objects.filter(pk__in=ids).order_by("pk"))
+    algorithms = {name: scan.ALGORITHMS[name] for name in names}
+    scansions = engine.scan_poems([poem.poem for poem in poems], algorithms,
+                                  [poem.get_tokens() for poem in poems])
+    return [(poem.pk, poem.get_hash(), s) for poem, s in zip(poems, scansions)]
+
+def save_chunk(results, algorithms, version):
+    """Write a chunk's scansions with one bulk update and one bulk insert"""
+    from scansion.models import MachineScansion
+    ids = [poem_id for poem_id, poem_hash, scansions in results]
+    stored = {(s.poem_id, s.algorithm_id): s for s in MachineScansion.objects.filter(poem_id__in=ids)}
+    changed = []
+    new = []
+    for poem_id, poem_hash, scansions in results:
+        for algorithm in algorithms:
+            s = stored.get((poem_id, algorithm.pk))
+            if s is None:
+                s = MachineScansion(poem_id=poem_id, algorithm=algorithm)
+                new.append(s)
+            else:
+                changed.append(s)
+            s.scansion = scansions[algorithm.name]
+            s.poem_hash = poem_hash
+            s.lexicon_version = version
+    with transaction.atomic():
+        MachineScansion.objects.bulk_update(changed, ["scansion", "poem_hash", "lexicon_version"])
+        MachineScansion.objects.bulk_create(new)
+
+class Command(BaseCommand):
+    help = "Rescan every poem with every algorithm and store the MachineScansions"
+
+    def add_arguments(self, parser):
+        from scansion import engine
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="processes to scan in; 1 scans in this process")
+        parser.add_argument("--chunk-size", type=int, default=engine.CHUNK_SIZE,
+                            help="poems per chunk handed to a worker")
+        parser.add_argument("--checkpoint", default=str(CHECKPOINT),
+                            help="file recording progress")
+        parser.add_argument("--lock", default=str(LOCK),
+                            help="file locked while the rescan runs, so only one runs at a time")
+        parser.add_argument("--resume", action="store_true",
+                            help="skip poems finished before an interrupted run")
+        parser.add_argument("--stale", action="store_true",
+                            help="only rescan poems whose text or words changed since their last scan")
+
+    def handle(self, *args, **options):
+        lock = acquire_lock(options["lock"])
+        if lock is None:
+            raise CommandError("A rescan is already running")
+        with lock:
+            self.rescan(options)
+
+    def rescan(self, options):
+        from scansion import lexicon, scan
+        from scansion.models import Poem, Algorithm
+        checkpoint = options["checkpoint"]
+        algorithms = list(Algorithm.objects.all())
+        names = [algorithm.name for algorithm in algorithms]
+        version = lexicon.current_version()
+        # load the snapshot before forking so workers can share it
+        lexicon.get_lexicon(version)
+
+        ids = Poem.objects.order_by("pk").values_list("pk", flat=True)
+        if options["resume"] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                last_id = json.load(f)["last_id"]
+            ids = ids.filter(pk__gt=last_id)
+            self.stdout.write(f"Resuming after poem {last_id}")
+        ids = list(ids)
+        size = options["chunk_size"]
+        if options["stale"]:
+            stale = []
+            for i in range(0, len(ids), size):
+                poems = list(Poem.objects.filter(pk__in=ids[i:i + size]).order_by("pk").only("poem"))
+                stale.extend(scan.stale_poems(poems, algorithms))
+            self.stdout.write(f"{len(stale)} of {len(ids)} poems are stale")
+            ids = stale
+        chunks = [(ids[i:i + size], names) for i in range(0, len(ids), size)]
+
+        start = time.time()
+        done = 0
+        if options["workers"] > 1 and len(chunks) > 1:
+            connections.close_all()
+            with multiprocessing.Pool(options["workers"], initializer=init_worker) as pool:
+                for results in pool.imap(scan_chunk, chunks):
+                    done = self.finish_chunk(results, algorithms, version, checkpoint, done, len(ids), start)
+        else:
+            for chunk in chunks:
+                done = self.finish_chunk(scan_chunk(chunk), algorithms, version, checkpoint, done, len(ids), start)
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(f"Rescanned {done} poems with {len(algorithms)} algorithms "
+                          f"in {time.time() - start:.1f}s")
+
+    def finish_chunk(self, results, algorithms, version, checkpoint, done, total, start):
+        """Save a scanned chunk, record progress and report it"""
+        save_chunk(results, algorithms, version)
+        # chunks arrive in order, so every poem up to this one is done
+        if results:
+            with open(checkpoint, "w") as f:
+                json.dump({"last_id": results[-1][0], "lexicon_version": version}, f)
+        done += len(results)
+        self.stdout.write(f"{done}/{total} poems ({time.time() - start:.1f}s)")
+        return done
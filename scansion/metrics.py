@@ -0,0 +1,260 @@
+"""MODULE METRICS
+==============
+This module keeps in-process histograms of how long views and scans
+take, how many queries they make and how long the poems scanned are,
+counts hits and misses of the poem context cache, and renders them
+in the Prometheus text format.
+
+Observing a value only bumps a few counters, so the histograms can
+stay on all the time; the text is built only when it is scraped.
+Each process keeps its own histograms.
+
+Async views make their queries in sync_to_async threads, each with its
+own connection, so requests are counted through a context variable,
+which sync_to_async carries into those threads, and a wrapper on every
+connection that adds to the counter it holds.
+
+Classes
+-------
+Histogram : Count observations in buckets, per set of labels.
+Counter : Count events, per set of labels.
+QueryCounter : Database execute wrapper counting queries.
+
+Functions
+---------
+track(seconds, queries, **labels) : Observe time and queries of a block.
+count_request_queries(connection) : Count a connection's queries for requests.
+metrics_middleware(get_response) : Observe time and queries of every view.
+syllable_count(stats) : Count syllables in poem_stats output.
+render() : Return every metric in Prometheus text format.
+reset() : Forget every observation.
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SYLLABLES_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+REGISTRY = []
+
+def _escape(value):
+    """Escape a label value for the text format"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Histogram:
+    """Count observations in cumulative buckets, per set of label values
+
+    Parameters
+    ----------
+    name : str
+        metric name
+    documentation : str
+        help text
+    buckets : tuple of numbers
+        upper bounds of the buckets, ascending; +Inf is added
+    labelnames : tuple of str
+        labels every observation must give
+    """
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        """Count value under the given label values"""
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts (last is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def series(self, **labels):
+        """Return (bucket counts, sum, count) for label values, or None"""
+        with self._lock:
+            series = self._series.get(tuple(labels[name] for name in self.labelnames))
+            return None if series is None else (list(series[0]), series[1], series[2])
+
+    def render(self):
+        """Return this histogram as lines of Prometheus text"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(snapshot, key=lambda s: [str(v) for v in s[0]]):
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+class Counter:
+    """Count events, per set of label values
+
+    Parameters
+    ----------
+    name : str
+        metric name
+    documentation : str
+        help text
+    labelnames : tuple of str
+        labels every event must give
+    """
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        """Add amount under the given label values"""
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Return the count for label values"""
+        with self._lock:
+            return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        """Return this counter as lines of Prometheus text"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = list(self._values.items())
+        for key, value in sorted(snapshot, key=lambda s: [str(v) for v in s[0]]):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {value}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+VIEW_SECONDS = Histogram("scansion_view_seconds", "Time to answer a request, by view.",
+                         SECONDS_BUCKETS, ("view",))
+VIEW_QUERIES = Histogram("scansion_view_queries", "SQL queries made answering a request, by view.",
+                         QUERIES_BUCKETS, ("view",))
+CONTEXT_SECONDS = Histogram("scansion_context_seconds", "Time to build a poem's frontend context.",
+                            SECONDS_BUCKETS)
+SCAN_SECONDS = Histogram("scansion_scan_seconds",
+                         "Time to scan a poem, by algorithm; \"stats\" is the shared lexicon lookup.",
+                         SECONDS_BUCKETS, ("algorithm",))
+SCAN_QUERIES = Histogram("scansion_scan_queries", "SQL queries made scanning a poem, by algorithm.",
+                         QUERIES_BUCKETS, ("algorithm",))
+SCAN_SYLLABLES = Histogram("scansion_scan_syllables", "Syllables in poems scanned, by algorithm.",
+                           SYLLABLES_BUCKETS, ("algorithm",))
+CONTEXT_CACHE = Counter("scansion_context_cache_total",
+                        "Lookups of cached poem contexts, by result (hit or miss).", ("result",))
+
+class QueryCounter:
+    """Execute wrapper (see connection.execute_wrapper) counting queries"""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+@contextmanager
+def track(seconds, queries, **labels):
+    """Observe wall time and, unless queries is None, query count of the enclosed block"""
+    counter = QueryCounter()
+    start = time.perf_counter()
+    try:
+        with nullcontext() if queries is None else connection.execute_wrapper(counter):
+            yield
+    finally:
+        seconds.observe(time.perf_counter() - start, **labels)
+        if queries is not None:
+            queries.observe(counter.count, **labels)
+
+# counter of the request being answered, in whichever thread it queries
+_request_counter = ContextVar("request_counter", default=None)
+
+def _count_request_query(execute, sql, params, many, context):
+    counter = _request_counter.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+def count_request_queries(connection):
+    """Count a connection's queries for the request being answered, if any"""
+    if _count_request_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_request_query)
+
+def syllable_count(stats):
+    """Count syllables in poem_stats output"""
+    return sum(1 for line in stats for value in line if value != " ")
+
+def _observe_view(request, counter, start):
+    match = request.resolver_match
+    view = match.view_name if match else "unresolved"
+    VIEW_SECONDS.observe(time.perf_counter() - start, view=view)
+    VIEW_QUERIES.observe(counter.count, view=view)
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Observe wall time and query count of every request, by view name"""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            counter = QueryCounter()
+            start = time.perf_counter()
+            token = _request_counter.set(counter)
+            try:
+                response = await get_response(request)
+            finally:
+                _request_counter.reset(token)
+            _observe_view(request, counter, start)
+            return response
+    else:
+        def middleware(request):
+            counter = QueryCounter()
+            start = time.perf_counter()
+            # in case this thread connected before the app was ready
+            count_request_queries(connection)
+            token = _request_counter.set(counter)
+            try:
+                response = get_response(request)
+            finally:
+                _request_counter.reset(token)
+            _observe_view(request, counter, start)
+            return response
+    return middleware
+
+def render():
+    """Return every metric in Prometheus text format"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+def reset():
+    """Forget every observation"""
+    for metric in REGISTRY:
+        metric.reset()
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+from scansion import parse
+
+BATCH_SIZE = 500
+
+
+def backfill_tallies(apps, schema_editor):
+    Word = apps.get_model('scansion', 'Word')
+    StressPattern = apps.get_model('scansion', 'StressPattern')
+    ids = list(Word.objects.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(ids), BATCH_SIZE):
+        batch = ids[i:i + BATCH_SIZE]
+        patterns = {}
+        for pattern in StressPattern.objects.filter(word_id__in=batch).order_by('pk'):
+            patterns.setdefault(pattern.word_id, []).append(pattern)
+        words = list(Word.objects.filter(pk__in=patterns))
+        for word in words:
+            count, tallies = parse.stress_tallies(patterns[word.pk])
+            word.dominant_syllables = count
+            word.stress_tallies = parse.encode_tallies(tallies)
+        Word.objects.bulk_update(words, ['dominant_syllables', 'stress_tallies'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0010_alter_word_part_of_speech'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='dominant_syllables',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='stress_tallies',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.RunPython(backfill_tallies, migrations.RunPython.noop),
+    ]
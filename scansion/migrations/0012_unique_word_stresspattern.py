@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:37
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+from scansion import parse
+
+
+def merge_duplicates(apps, schema_editor):
+    Word = apps.get_model('scansion', 'Word')
+    StressPattern = apps.get_model('scansion', 'StressPattern')
+    merged_words = set()
+
+    # fold each duplicate Word into its oldest copy, moving its patterns over
+    duplicate_words = (Word.objects.values('word').annotate(n=Count('pk'), keep=Min('pk'))
+                       .filter(n__gt=1))
+    for duplicate in duplicate_words:
+        keeper = Word.objects.get(pk=duplicate['keep'])
+        others = Word.objects.filter(word=duplicate['word']).exclude(pk=keeper.pk).order_by('pk')
+        for other in others:
+            keeper.popularity += other.popularity
+            if not keeper.syllables:
+                keeper.syllables = other.syllables
+            if not keeper.pronunciation_line:
+                keeper.pronunciation_line = other.pronunciation_line
+            if not keeper.part_of_speech:
+                keeper.part_of_speech = other.part_of_speech
+        keeper.save()
+        StressPattern.objects.filter(word__in=others).update(word=keeper)
+        others.delete()
+        merged_words.add(keeper.pk)
+
+    # fold each duplicate StressPattern into its oldest copy, adding popularities
+    duplicate_patterns = (StressPattern.objects.values('word', 'stresses')
+                          .annotate(n=Count('pk'), keep=Min('pk')).filter(n__gt=1))
+    for duplicate in duplicate_patterns:
+        patterns = StressPattern.objects.filter(word=duplicate['word'], stresses=duplicate['stresses'])
+        keeper = StressPattern.objects.get(pk=duplicate['keep'])
+        keeper.popularity = sum(pattern.popularity for pattern in patterns)
+        keeper.save()
+        patterns.exclude(pk=keeper.pk).delete()
+        merged_words.add(duplicate['word'])
+
+    # merged words' stored tallies may now be out of date
+    for word in Word.objects.filter(pk__in=merged_words):
+        count, tallies = parse.stress_tallies(list(StressPattern.objects.filter(word=word).order_by('pk')))
+        word.dominant_syllables = count
+        word.stress_tallies = parse.encode_tallies(tallies)
+        word.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0011_word_stress_tallies'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='word',
+            name='word',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='stresspattern',
+            constraint=models.UniqueConstraint(fields=('word', 'stresses'), name='unique_stress_pattern'),
+        ),
+    ]
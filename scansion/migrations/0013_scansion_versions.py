@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0012_unique_word_stresspattern'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machinescansion',
+            name='lexicon_version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='machinescansion',
+            name='poem_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='lexicon_version',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from scansion import parse
+
+BATCH_SIZE = 500
+
+
+def index_poems(apps, schema_editor):
+    Poem = apps.get_model('scansion', 'Poem')
+    PoemWord = apps.get_model('scansion', 'PoemWord')
+    ids = list(Poem.objects.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(ids), BATCH_SIZE):
+        poems = Poem.objects.filter(pk__in=ids[i:i + BATCH_SIZE]).only('poem')
+        PoemWord.objects.bulk_create([
+            PoemWord(poem=poem, word=word, line=line, position=position)
+            for poem in poems for line, position, word in parse.word_positions(poem.poem)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0013_scansion_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PoemWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(db_index=True, max_length=50)),
+                ('line', models.IntegerField()),
+                ('position', models.IntegerField()),
+                ('poem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scansion.poem')),
+            ],
+        ),
+        migrations.RunPython(index_poems, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from scansion import parse
+
+
+def count_votes(apps, schema_editor):
+    HumanScansion = apps.get_model('scansion', 'HumanScansion')
+    ScansionVote = apps.get_model('scansion', 'ScansionVote')
+    poem_ids = HumanScansion.objects.order_by().values_list('poem_id', flat=True).distinct()
+    for poem_id in list(poem_ids):
+        votes = {}
+        for hs in HumanScansion.objects.filter(poem_id=poem_id).order_by('pk'):
+            if not hs.scansion:
+                continue
+            for line, words in parse.make_dict(hs.scansion).items():
+                for word, variant in words.items():
+                    count, last_vote = votes.get((line, word, variant), (0, 0))
+                    votes[(line, word, variant)] = (count + 1, hs.pk)
+        ScansionVote.objects.bulk_create([
+            ScansionVote(poem_id=poem_id, line=line, word=word, variant=variant, votes=count, last_vote=last_vote)
+            for (line, word, variant), (count, last_vote) in votes.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0014_poemword'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScansionVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.IntegerField()),
+                ('word', models.IntegerField()),
+                ('variant', models.CharField(max_length=50)),
+                ('votes', models.IntegerField(default=0)),
+                ('last_vote', models.IntegerField(default=0)),
+                ('poem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scansion.poem')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='scansionvote',
+            constraint=models.UniqueConstraint(fields=('poem', 'line', 'word', 'variant'), name='unique_scansion_vote'),
+        ),
+        migrations.RunPython(count_votes, migrations.RunPython.noop),
+    ]
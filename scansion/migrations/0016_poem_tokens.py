@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+from scansion import parse
+
+BATCH_SIZE = 500
+
+
+def tokenize_poems(apps, schema_editor):
+    Poem = apps.get_model('scansion', 'Poem')
+    ids = list(Poem.objects.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(ids), BATCH_SIZE):
+        poems = list(Poem.objects.filter(pk__in=ids[i:i + BATCH_SIZE]).only('poem'))
+        for poem in poems:
+            poem.tokens = parse.encode_tokens(parse.tokenize(poem.poem))
+        Poem.objects.bulk_update(poems, ['tokens'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0015_scansionvote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poem',
+            name='tokens',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(tokenize_poems, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+def mark_human_scanned(apps, schema_editor):
+    Poem = apps.get_model('scansion', 'Poem')
+    Poem.objects.exclude(scansion='').update(human_scanned=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0016_poem_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poem',
+            name='human_scanned',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='poem',
+            index=models.Index(fields=['poet', 'human_scanned'], name='poem_poet_human_scanned'),
+        ),
+        migrations.RunPython(mark_human_scanned, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+from scansion import parse
+
+BATCH_SIZE = 500
+DISPLAY_TITLE_LENGTH = 255
+
+
+def first_line(poem):
+    # Poem.first_line, which historical models lack
+    for line in poem.splitlines():
+        if line and parse.WORD.search(line):
+            return line
+    return "Nonexistent poem"
+
+
+def set_display_titles(apps, schema_editor):
+    Poem = apps.get_model('scansion', 'Poem')
+    ids = list(Poem.objects.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(ids), BATCH_SIZE):
+        poems = list(Poem.objects.filter(pk__in=ids[i:i + BATCH_SIZE]).only('title', 'poem'))
+        for poem in poems:
+            poem.display_title = (poem.title or first_line(poem.poem))[:DISPLAY_TITLE_LENGTH]
+        Poem.objects.bulk_update(poems, ['display_title'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0017_poem_human_scanned'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poem',
+            name='display_title',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(set_display_titles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:12
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def start_counter(apps, schema_editor):
+    Word = apps.get_model('scansion', 'Word')
+    LexiconVersion = apps.get_model('scansion', 'LexiconVersion')
+    latest = Word.objects.aggregate(version=Max('lexicon_version'))['version'] or 0
+    LexiconVersion.objects.create(pk=1, number=latest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0018_poem_display_title'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LexiconVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(start_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scansion', '0019_lexiconversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='word',
+            name='dominant_syllables',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='word',
+            name='stress_tallies',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+    ]
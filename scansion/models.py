@@ -1,9 +1,14 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Max
 from datetime import date
+import hashlib
 
 from . import parse
 
+# SQLite refuses queries with more than 999 parameters
+BATCH_SIZE = 900
+
 # Create your models here.
 class User(AbstractUser):
     score = models.IntegerField(default=0)
@@ -24,22 +29,81 @@ class Word(models.Model):
                        ("con", "Conjunction"), 
                        ("art", "Article"), 
                        ("int", "Interjection")]
-    word = models.CharField(max_length=50)
+    word = models.CharField(max_length=50, unique=True)
     popularity = models.IntegerField(default=0)
     # "pronunciation" fr/ Websters1913 (syllable splits and accents)
     # eventually I may get real pronunciations from, e.g., wiktionary
     pronunciation_line = models.CharField(max_length=70, blank=True)
     syllables = models.IntegerField(null=True, blank=True)
     part_of_speech = models.CharField(max_length=3, choices=PARTS_OF_SPEECH, default="")
+    # denormalized from this word's StressPatterns (see scan.record and
+    # signals.stress_pattern_changed): most popular syllable count and
+    # parse.encode_tallies of its stresses
+    dominant_syllables = models.IntegerField(null=True, blank=True, editable=False)
+    stress_tallies = models.CharField(max_length=200, blank=True, editable=False)
+    # lexicon version at which this word's stresses last changed;
+    # the highest of these is the version of the whole lexicon
+    lexicon_version = models.IntegerField(default=0, db_index=True)
+
+    def stress_ratios(self):
+        """Return stress ratio for each syllable from stored tallies"""
+        return parse.tally_ratios(parse.decode_tallies(self.stress_tallies))
+
+    def rebuild_stress_tallies(self, save=True):
+        """Recompute stored tallies from this word's StressPatterns
+
+        Saving marks the word changed in a new lexicon version, as
+        scan.record does, so snapshots and machine scansions catch up.
+        """
+        if not save:
+            self._compute_stress_tallies()
+            return
+        from . import lexicon
+        with transaction.atomic():
+            self.lexicon_version = lexicon.next_version()
+            self._compute_stress_tallies()
+            self.save(update_fields=["dominant_syllables", "stress_tallies", "lexicon_version"])
+        lexicon.store([self])
+
+    def _compute_stress_tallies(self):
+        patterns = list(self.stresspattern_set.order_by("pk"))
+        count, tallies = parse.stress_tallies(patterns)
+        self.dominant_syllables = count
+        self.stress_tallies = parse.encode_tallies(tallies)
 
     def __str__(self):
         return self.word
 
+class LexiconVersion(models.Model):
+    """Single-row counter handing out lexicon versions
+
+    See lexicon.next_version, which bumps it inside the transaction
+    changing words, so that writers of the lexicon take turns.
+    """
+    number = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Lexicon version {self.number}"
+
 class StressPattern(models.Model):
     word = models.ForeignKey(Word, on_delete=models.PROTECT)
     stresses = models.CharField(max_length=20)
     popularity = models.IntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["word", "stresses"], name="unique_stress_pattern")
+        ]
+
+    # word this pattern was loaded for, whose tallies change too if it moves
+    _loaded_word_id = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_word_id = instance.__dict__.get("word_id")
+        return instance
+
     def is_valid(self):
         for char in self.stresses:
             if char not in [" ", parse.UNKNOWN, parse.STRESSED, parse.UNSTRESSED]:
@@ -74,11 +138,99 @@ class Poet(models.Model):
     def __str__(self):
         return f"{self.last_name}"
 
+DISPLAY_TITLE_LENGTH = 255
+
 class Poem(models.Model):
     title = models.TextField(blank=True)
     poet = models.ForeignKey(Poet, on_delete=models.SET_NULL, blank=True, null=True)
     scansion = models.TextField(blank=True)
+    # whether scansion is set, kept up to date by save, to filter on an index
+    human_scanned = models.BooleanField(default=False, db_index=True, editable=False)
     poem = models.TextField()
+    # title, or first line if untitled, kept up to date by save, for listings
+    display_title = models.CharField(max_length=DISPLAY_TITLE_LENGTH, blank=True, db_index=True, editable=False)
+    # parse.encode_tokens(parse.tokenize(poem)), kept up to date by save
+    tokens = models.TextField(blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["poet", "human_scanned"], name="poem_poet_human_scanned")
+        ]
+
+    # text the saved PoemWord index was built from, and text tokens was made from
+    _indexed_text = None
+    _tokenized_text = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._indexed_text = instance._tokenized_text = instance.__dict__.get("poem")
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if ("scansion" not in self.get_deferred_fields()
+                and (update_fields is None or "scansion" in update_fields)):
+            self.human_scanned = bool(self.scansion)
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = list(update_fields) + ["human_scanned"]
+        if (not {"title", "poem"} & self.get_deferred_fields()
+                and (update_fields is None or {"title", "poem"} & set(update_fields))):
+            self.display_title = self.get_display_title()
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = list(update_fields) + ["display_title"]
+        reindex = ("poem" not in self.get_deferred_fields()
+                   and (update_fields is None or "poem" in update_fields)
+                   and self.poem != self._indexed_text)
+        if reindex:
+            if self._tokenized_text != self.poem:
+                self.set_tokens()
+            if update_fields is not None:
+                kwargs["update_fields"] = list(update_fields) + ["tokens"]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if reindex:
+                self.index_words()
+
+    def set_tokens(self):
+        """Tokenize the poem's text into tokens, without saving"""
+        self.tokens = parse.encode_tokens(parse.tokenize(self.poem))
+        self._tokenized_text = self.poem
+
+    def get_tokens(self):
+        """Return parse.tokenize(self.poem), from tokens if they are up to date"""
+        if self.tokens and self._tokenized_text == self.poem:
+            return parse.decode_tokens(self.tokens, self.poem)
+        return parse.tokenize(self.poem)
+
+    def word_occurrences(self):
+        """Return unsaved PoemWords for every word of the poem"""
+        return [PoemWord(poem=self, word=word, line=line, position=position)
+                for line, position, word in parse.word_positions(self.poem, self.get_tokens())]
+
+    def index_words(self):
+        """Rebuild this poem's PoemWords from its text"""
+        PoemWord.objects.filter(poem=self).delete()
+        PoemWord.objects.bulk_create(self.word_occurrences())
+        self._indexed_text = self.poem
+
+    def rebuild_votes(self):
+        """Recount this poem's ScansionVotes from all its HumanScansions"""
+        votes = {}
+        for hs in self.humanscansion_set.order_by("pk"):
+            for key in hs.tokens():
+                count, last_vote = votes.get(key, (0, 0))
+                votes[key] = (count + 1, hs.pk)
+        ScansionVote.objects.filter(poem=self).delete()
+        ScansionVote.objects.bulk_create([
+            ScansionVote(poem=self, line=line, word=word, variant=variant, votes=count, last_vote=last_vote)
+            for (line, word, variant), (count, last_vote) in votes.items()
+        ])
+
+    def lexicon_version(self):
+        """Return latest lexicon version at which any word of the poem changed"""
+        words = PoemWord.objects.filter(poem=self).values("word")
+        return Word.objects.filter(word__in=words).aggregate(version=Max("lexicon_version"))["version"] or 0
     
     def first_line(self):
         lines = self.poem.splitlines()
@@ -87,6 +239,14 @@ class Poem(models.Model):
                 return line
         return "Nonexistent poem"
 
+    def get_display_title(self):
+        """Return title, or first line if untitled, cut to fit display_title"""
+        return (self.title or self.first_line())[:DISPLAY_TITLE_LENGTH]
+
+    def get_hash(self):
+        """Return hash of poem text to tell whether a scansion is of it"""
+        return hashlib.sha256(self.poem.encode()).hexdigest()
+
     def has_valid_scansion(self):
         for char in self.scansion:
             if char not in [" ", parse.STRESSED, parse.UNSTRESSED, "\n", "\r", "\r\n"]:
@@ -95,15 +255,26 @@ class Poem(models.Model):
         return True
 
     def __str__(self):
-        if self.title:
-            t = self.title
-        else:
-            t = self.first_line()
+        t = self.display_title or self.get_display_title()
         if self.poet:
             return f"{t} by {self.poet.last_name}"
         else:
             return t
 
+class PoemWord(models.Model):
+    """Occurrence of a cleaned word in a poem
+
+    Lets changes to a word's stress patterns find the poems they
+    affect. line and position number words as parse.make_dict_p does.
+    """
+    poem = models.ForeignKey(Poem, on_delete=models.CASCADE)
+    word = models.CharField(max_length=50, db_index=True)
+    line = models.IntegerField()
+    position = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.word} at {self.line}:{self.position} of poem {self.poem_id}"
+
 class Algorithm(models.Model):
     name = models.CharField(max_length=50)
     about = models.TextField(blank=True)
@@ -116,6 +287,37 @@ class HumanScansion(models.Model):
     poem = models.ForeignKey(Poem, on_delete=models.CASCADE)
     scansion = models.TextField()
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.count_votes()
+            else:
+                # an edited scansion takes back its old votes
+                self.poem.rebuild_votes()
+
+    def tokens(self):
+        """Return (line, word, variant) for each word of the scansion"""
+        if not self.scansion:
+            return []
+        return [(line, word, variant) for line, words in parse.make_dict(self.scansion).items()
+                for word, variant in words.items()]
+
+    def count_votes(self):
+        """Add this scansion's votes to its poem's ScansionVotes"""
+        tokens = self.tokens()
+        existing = {(v.line, v.word, v.variant): v.pk for v in ScansionVote.objects.select_for_update()
+                    .filter(poem_id=self.poem_id).only("line", "word", "variant")}
+        voted = [existing[token] for token in tokens if token in existing]
+        for i in range(0, len(voted), BATCH_SIZE):
+            ScansionVote.objects.filter(pk__in=voted[i:i + BATCH_SIZE]).update(
+                votes=F("votes") + 1, last_vote=self.pk)
+        ScansionVote.objects.bulk_create([
+            ScansionVote(poem_id=self.poem_id, line=line, word=word, variant=variant, votes=1, last_vote=self.pk)
+            for line, word, variant in tokens if (line, word, variant) not in existing
+        ])
     
     def is_valid(self):
         for char in self.scansion:
@@ -126,10 +328,44 @@ class HumanScansion(models.Model):
     def __str__(self):
         return f"User{self.user.id}'s scansion of {self.poem.__str__()}"
 
+class ScansionVote(models.Model):
+    """Votes of a poem's HumanScansions for one way to scan one word
+
+    line and word number words as parse.make_dict does. votes counts
+    the human scansions marking the word with variant, and last_vote is
+    the pk of the latest of them, which breaks ties in scan.reconcile.
+    """
+    poem = models.ForeignKey(Poem, on_delete=models.CASCADE)
+    line = models.IntegerField()
+    word = models.IntegerField()
+    variant = models.CharField(max_length=50)
+    votes = models.IntegerField(default=0)
+    last_vote = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["poem", "line", "word", "variant"], name="unique_scansion_vote")
+        ]
+
+    def __str__(self):
+        return f"{self.variant} at {self.line}:{self.word} of poem {self.poem_id}, votes: {self.votes}"
+
 class MachineScansion(models.Model):
     poem = models.ForeignKey(Poem, on_delete=models.CASCADE)
     scansion = models.TextField()
     algorithm = models.ForeignKey(Algorithm, on_delete=models.CASCADE)
+    # what the scansion was computed from: Poem.get_hash() of the text
+    # and the lexicon version (see lexicon.current_version)
+    poem_hash = models.CharField(max_length=64, blank=True)
+    lexicon_version = models.IntegerField(default=0)
+
+    def is_current(self, poem_hash, lexicon_version):
+        """Return True if scansion was made from this text and lexicon
+
+        lexicon_version is Poem.lexicon_version(): the scansion is
+        current unless a word of the poem changed after it was made.
+        """
+        return self.poem_hash == poem_hash and self.lexicon_version >= lexicon_version
     
     def is_valid(self):
         for char in self.scansion:
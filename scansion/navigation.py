@@ -0,0 +1,92 @@
+"""MODULE NAVIGATION
+=================
+This module builds the poet and poem menus for the frontend from
+indexed columns and caches them until poems or scansions change.
+
+The menus and their version live in the "navigation" cache, which
+every worker process shares, so invalidating in one process reaches
+them all. Menus also expire after the cache's TIMEOUT.
+
+Functions
+---------
+poet_names(promoted) : Return poet menu for promoted or other users.
+poet_poems(poet) : Return poem menu for a poet.
+version() : Return the current menu version.
+invalidate() : Forget cached menus.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef
+
+from .models import Poet, Poem
+
+CACHE_ALIAS = "navigation"
+VERSION_KEY = "navigation:version"
+
+def _cache():
+    """Return the navigation cache, or the default one if none is configured"""
+    return caches[CACHE_ALIAS if CACHE_ALIAS in settings.CACHES else "default"]
+
+def version():
+    """Return the menu version, which changes whenever the menus might"""
+    # a fresh random version if the key is missing, say culled from the
+    # cache, so menus cached under an old version are never reused
+    return _cache().get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+
+def _key(*parts):
+    """Make cache key under the current navigation version"""
+    return ":".join(["navigation", str(version())] + [str(part) for part in parts])
+
+def poet_names(promoted):
+    """Return last names of poets to offer, alphabetically
+
+    Promoted users see every poet; others only poets with at least
+    one human-scanned poem.
+    """
+    key = _key("poets", "promoted" if promoted else "unpromoted")
+    names = _cache().get(key)
+    if names is None:
+        poets = Poet.objects.order_by("last_name")
+        if not promoted:
+            # one lookup on the (poet, human_scanned) index per poet
+            poets = poets.filter(Exists(Poem.objects.filter(poet=OuterRef("pk"), human_scanned=True)))
+        names = list(poets.values_list("last_name", flat=True))
+        _cache().set(key, names)
+    return names
+
+def poet_poems(poet):
+    """Return [id, title] of a poet's poems, split by who scanned them
+
+    Parameters
+    ----------
+    poet : Poet or None
+        poet whose poems to list; None for poems with no poet
+
+    Returns
+    -------
+    poems_dict : dict
+        "human_scanned" and "computer_scanned" lists of [id, title]
+    """
+    key = _key("poems", poet.pk if poet else "unknown")
+    poems_dict = _cache().get(key)
+    if poems_dict is None:
+        if poet:
+            ps = Poem.objects.filter(poet=poet)
+        else:
+            ps = Poem.objects.filter(poet__isnull=True)
+        # each list is a range of the (poet, human_scanned) index
+        poems_dict = {
+            "human_scanned": [list(p) for p in ps.filter(human_scanned=True)
+                              .order_by("pk").values_list("id", "display_title")],
+            "computer_scanned": [list(p) for p in ps.filter(human_scanned=False)
+                                 .order_by("pk").values_list("id", "display_title")],
+        }
+        _cache().set(key, poems_dict)
+    return poems_dict
+
+def invalidate():
+    """Forget every cached menu by moving to a new version"""
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, None)
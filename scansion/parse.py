@@ -7,17 +7,30 @@
    clean_poem(poem) : Return poem with dashes replaced by spaces
    clean(word) : Return word processed for lookup
    make_dict(scansion): Turn string scansion into dictionary
+   tokenize(poem) : Split poem into lines of words in one pass
+   encode_tokens(lines) : Turn tokenize output into string for Poem
+   decode_tokens(encoded, poem) : Turn string from Poem into tokens
    make_dict_p(poem): Turn string poem into dictionary
+   word_positions(poem): Find line, position and cleaned form of words
    make_string(scansion): Turn dict scansion into string
+   blank_slate(scansion): Mark every syllable of scansion unstressed
    syllable_counter(stress_pattern_queryset) : Find popular syll counts
    calculate_ratios(word) : Find stressed / unstressed for syllables
+   stress_tallies(stress_pattern_list) : Count stresses for syllables
+   add_to_tallies(tallies, stresses, popularity) : Count more stresses
+   encode_tallies(tallies) : Turn stress tallies into string for Word
+   decode_tallies(encoded) : Turn string from Word into stress tallies
+   tally_ratios(tallies) : Find stressed / unstressed from tallies
    preliminary_syllable_count(word): Count vowel clusters
    adjustment_for_two_syll_clusters(word): Count 2-syll vowel clusters
    silent_final_e: Return True if silent final e, False otherwise
    other_silent_e: Return True if other silent e, False otherwise
    """
 
+import json
 import re
+from collections import namedtuple
+from itertools import chain
 
 # regexes to reuse in other modules
 NEWLINE = re.compile("\r\n|\n|\r")
@@ -25,6 +38,22 @@ DISALLOWED = re.compile("[^-A-Za-zé]")
 DASH = re.compile(" *-- *| *– *| *— *")
 SLASH = re.compile(" */ *")
 WORD = re.compile("\w+")
+SYLLABLE = re.compile(r"\S")
+# what clean_poem and str.split() together break words at
+SEPARATOR = re.compile(r"--|[/–—]|\s")
+
+# regexes for guessing syllable counts; see tests/test_parse.py for examples
+VOWEL_CLUSTER = re.compile("[AEÉIOUaeéiouy]+")
+TWO_SYLLABLE_CLUSTER = re.compile("[aiouy]é|ao|eo[^u]|ia[^n]|[^ct]ian|iet|io[^nu]|[^c]iu|[^gq]ua|[^gq]ue[lt]|[^q]uo|[aeiouy]ing|[aeiou]y[aiou]") # exceptions: Preus, Aida, poet, luau)
+# e is usually silent at the ends of word
+# but there are exceptions like "cable,"
+# "cadre," and "untrue"
+AUDIBLE_FINAL_E = re.compile('[^aeiouylrw]le$|[^aeiouywr]re$|[aeioy]e|[^g]ue')
+# final -ed or -es unlikely to represent its own syllable
+SILENT_FINAL_ED_ES = re.compile("[^aeiouydlrt]ed$|[^aeiouycghjlrsxz]es$|thes$|[aeiouylrw]led$|[aeiouylrw]les$|[aeiouyrw]res$|[aeiouyrw]red$")
+# e in the middle unlikely to represent a syllable
+# as in 'lonely' or 'surely'
+CONSONANT_E_LY = re.compile("[^aeiouy]ely$")
 
 # scansion symbols 
 UNKNOWN = "?"
@@ -42,6 +71,52 @@ def clean(word):
     w = re.sub(DISALLOWED, "", word)
     return w.lower()
 
+# word of a poem: original text, clean(text), and where text starts
+# and ends in the poem
+Token = namedtuple("Token", ["text", "cleaned", "start", "end"])
+
+def tokenize(poem):
+    """Split poem into lines of words in one pass
+
+    Gives the words clean_poem, NEWLINE.split, str.split and clean
+    would, leaving out those with no letters, as poem_stats and
+    make_dict_p do.
+
+    Returns
+    -------
+    lines : list of lists of Tokens
+        one list for each line, as NEWLINE.split(poem) gives them
+    """
+    lines = []
+    line_start = 0
+    for line in NEWLINE.split(poem):
+        tokens = []
+        word_start = 0
+        for separator in chain(SEPARATOR.finditer(line), [None]):
+            word_end = separator.start() if separator else len(line)
+            if word_end > word_start:
+                text = line[word_start:word_end]
+                cleaned = clean(text)
+                if cleaned:
+                    tokens.append(Token(text, cleaned, line_start + word_start, line_start + word_end))
+            if separator:
+                word_start = separator.end()
+        lines.append(tokens)
+        line_start += len(line)
+        # skip the line break that ended this line
+        line_start += len(NEWLINE.match(poem, line_start).group()) if line_start < len(poem) else 0
+    return lines
+
+def encode_tokens(lines):
+    """Turn tokenize output into a compact JSON string to store"""
+    return json.dumps([[[t.start, t.end, t.cleaned] for t in tokens] for tokens in lines],
+                      separators=(",", ":"))
+
+def decode_tokens(encoded, poem):
+    """Turn encode_tokens output back into tokenize output for poem"""
+    return [[Token(poem[start:end], cleaned, start, end) for start, end, cleaned in tokens]
+            for tokens in json.loads(encoded)]
+
 def make_dict(scansion):
         """Make dict id-ing scansion's words by line, word index"""
         if not scansion:
@@ -54,17 +129,33 @@ def make_dict(scansion):
                     line_word_dict[i][j] = word
             return line_word_dict
     
-def make_dict_p(poem):
-    """make dict id-ing poem's words by line, word index"""
-    p = clean_poem(poem)
+def make_dict_p(poem, tokens=None):
+    """make dict id-ing poem's words by line, word index
+
+    tokens, if given, is tokenize(poem), saving tokenizing it again.
+    """
+    if tokens is None:
+        tokens = tokenize(poem)
+    if not poem or poem[-1] in "\r\n":
+        # a final line break does not start a line
+        tokens = tokens[:-1]
     line_word_dict = {}
-    for i, line in enumerate(p.splitlines()):
-        line_word_dict[i] = {}
-        relevant_words = [word for word in line.split() if clean(word)]
-        for j, word in enumerate(relevant_words):
-            line_word_dict[i][j] = word
+    for i, line in enumerate(tokens):
+        line_word_dict[i] = {j: token.text for j, token in enumerate(line)}
     return line_word_dict
 
+def word_positions(poem, tokens=None):
+    """Yield (line, position, cleaned word) for each word of poem
+
+    Lines and positions are numbered as in make_dict_p. tokens, if
+    given, is tokenize(poem).
+    """
+    if tokens is None:
+        tokens = tokenize(poem)
+    for i, line in enumerate(tokens):
+        for j, token in enumerate(line):
+            yield i, j, token.cleaned
+
 def make_string(scansion_dict):
     s = ""
     for line in scansion_dict:
@@ -73,6 +164,10 @@ def make_string(scansion_dict):
         s += "\n"
     return s
 
+def blank_slate(scansion):
+    """Return scansion with every syllable marked unstressed"""
+    return SYLLABLE.sub(UNSTRESSED, scansion)
+
 def syllable_counter(stress_pattern_queryset):
     """Find StressPatterns with most popular syllable count
 
@@ -97,7 +192,7 @@ def syllable_counter(stress_pattern_queryset):
     most_popular_count = 0
 
     for pattern in stress_pattern_queryset:
-        count = pattern.get_syllable_count()
+        count = len(pattern.stresses)
         if count in count_dict:
             count_dict[count][0].append(pattern)
             count_dict[count][1] += pattern.popularity
@@ -127,7 +222,7 @@ def calculate_ratios(stress_pattern_list):
         for each syllable in word,
         rounded to 4 decimal places
     """
-    length = stress_pattern_list[0].get_syllable_count()
+    length = len(stress_pattern_list[0].stresses)
     value_list = []
     for i in range(length):
         stressed = 1
@@ -140,37 +235,73 @@ def calculate_ratios(stress_pattern_list):
         value_list.append(round(stressed / unstressed, 4))
     return value_list
 
+def stress_tallies(stress_pattern_list):
+    """Count popularity of stresses for each syllable of a word
+
+    Parameters
+    ----------
+    stress_pattern_list : list
+        list of StressPattern objects for a word, of any lengths
+
+    Returns
+    -------
+    count : int
+        most popular syllable count (None if there are no patterns)
+
+    tallies : list
+        [stressed, unstressed] popularity for each syllable
+        of the patterns with that syllable count
+    """
+    if not stress_pattern_list:
+        return None, []
+    stress_patterns, max_popularity, count = syllable_counter(stress_pattern_list)
+    tallies = [[0, 0] for i in range(count)]
+    for pattern in stress_patterns:
+        add_to_tallies(tallies, pattern.stresses, pattern.popularity)
+    return count, tallies
+
+def add_to_tallies(tallies, stresses, popularity):
+    """Add popularity to tallies for each stressed or unstressed syllable"""
+    for i, char in enumerate(stresses):
+        if char == STRESSED:
+            tallies[i][0] += popularity
+        elif char == UNSTRESSED:
+            tallies[i][1] += popularity
+
+def encode_tallies(tallies):
+    """Turn [[stressed, unstressed], ...] into "stressed,unstressed;..." """
+    return ";".join(f"{stressed},{unstressed}" for stressed, unstressed in tallies)
+
+def decode_tallies(encoded):
+    """Turn "stressed,unstressed;..." into [[stressed, unstressed], ...]"""
+    if not encoded:
+        return []
+    return [[int(n) for n in syllable.split(",")] for syllable in encoded.split(";")]
+
+def tally_ratios(tallies):
+    """Find ratio stressed / unstressed from tallies as calculate_ratios does"""
+    return [round((stressed + 1) / (unstressed + 1), 4) for stressed, unstressed in tallies]
+
 def preliminary_syllable_count(word):
     """Count clusters of 1 or more vowels (each likely a syllable)"""
-    vowels_or_vowel_clusters = re.findall("[AEÉIOUaeéiouy]+", word)
-    return len(vowels_or_vowel_clusters)
+    return len(VOWEL_CLUSTER.findall(word))
 
 def adjustment_for_two_syll_clusters(word):
     """Count clusters of vowels likely to have 2 syllables, not 1"""
     # This is massive and not intuitive. Examples of what it's doing can be found in tests/test_parse.py
-    two_syllable_clusters = re.findall("[aiouy]é|ao|eo[^u]|ia[^n]|[^ct]ian|iet|io[^nu]|[^c]iu|[^gq]ua|[^gq]ue[lt]|[^q]uo|[aeiouy]ing|[aeiou]y[aiou]", word) # exceptions: Preus, Aida, poet, luau)
-    return len(two_syllable_clusters)
+    return len(TWO_SYLLABLE_CLUSTER.findall(word))
 
 def silent_final_e(word):
     """Return true if there is likely a silent final e"""
-    # e is usually silent at the ends of word
-    # but there are exceptions like "cable,"
-    # "cadre," and "untrue"
-    audible_final_e = re.compile('[^aeiouylrw]le$|[^aeiouywr]re$|[aeioy]e|[^g]ue')
-    if word[-1] == "e" and not audible_final_e.search(word):
+    if word.endswith("e") and not AUDIBLE_FINAL_E.search(word):
         return True
     return False
 
 def other_silent_e(word):
     """Return true if other 'e's near end are likely silent"""
-    # final -ed or -es unlikely to represent its own syllable
-    silent_final_ed_es = re.compile("[^aeiouydlrt]ed$|[^aeiouycghjlrsxz]es$|thes$|[aeiouylrw]led$|[aeiouylrw]les$|[aeiouyrw]res$|[aeiouyrw]red$")
-    # e in the middle unlikely to represent a syllable
-    # as in 'lonely' or 'surely'
-    consonant_e_ly = re.compile("[^aeiouy]ely$")
     # If I find ways to identify other silent 'e's in words,
     # like the 'e' in 'sometimes' or the first in 'nonetheless'
     # this function may be expanded
-    if silent_final_ed_es.search(word) or consonant_e_ly.search(word):
+    if SILENT_FINAL_ED_ES.search(word) or CONSONANT_E_LY.search(word):
         return True
-    return False
\ No newline at end of file
+    return False
@@ -0,0 +1,146 @@
+"""MODULE RANDOM_POEMS
+===================
+This module picks random poems without loading every poem's id for
+each pick. It keeps the ids of every poem, and of human-scanned poems,
+in memory, updates them as poems are saved and deleted, and picks
+with one primary-key lookup.
+
+Each process keeps its own ids. Poems saved in other processes, or
+with bulk_create, are seen once the ids are reloaded, which happens
+every RELOAD_SECONDS; an id whose poem has gone or is no longer
+eligible is dropped when it is picked. If the ids run out, or after
+MAX_ATTEMPTS such picks, the database chooses instead.
+
+Classes
+-------
+IdPool : Ids to choose from at random, with O(1) adding and removal.
+
+Functions
+---------
+pick(human_scanned_only=False) : Return a random poem, or None.
+poem_saved(poem) : Add or move a saved poem's id.
+poem_deleted(poem_id) : Drop a deleted poem's id.
+invalidate() : Forget the ids so the next pick reloads them.
+"""
+
+import random
+import time
+from threading import Lock
+
+from .models import Poem
+
+RELOAD_SECONDS = 300
+# picks of gone or ineligible poems before falling back to the database
+MAX_ATTEMPTS = 10
+
+ALL = "all"
+HUMAN_SCANNED = "human_scanned"
+
+class IdPool:
+    """Ids to choose from at random, with O(1) adding and removal
+
+    The ids are kept in a list to choose from, with each id's index in
+    the list; removing an id moves the last one into its place.
+    """
+    def __init__(self, ids=()):
+        self.ids = list(ids)
+        self.positions = {poem_id: i for i, poem_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, poem_id):
+        return poem_id in self.positions
+
+    def add(self, poem_id):
+        if poem_id not in self.positions:
+            self.positions[poem_id] = len(self.ids)
+            self.ids.append(poem_id)
+
+    def discard(self, poem_id):
+        i = self.positions.pop(poem_id, None)
+        if i is None:
+            return
+        last = self.ids.pop()
+        if i < len(self.ids):
+            self.ids[i] = last
+            self.positions[last] = i
+
+    def choice(self):
+        """Return a random id, or None if there are none"""
+        return random.choice(self.ids) if self.ids else None
+
+_lock = Lock()
+_pools = None
+_loaded_at = 0
+
+def _get_pools():
+    """Return the id pools, loading them if they are missing or old"""
+    global _pools, _loaded_at
+    with _lock:
+        if _pools is None or time.monotonic() - _loaded_at > RELOAD_SECONDS:
+            _pools = {
+                ALL: IdPool(Poem.objects.values_list("pk", flat=True)),
+                HUMAN_SCANNED: IdPool(Poem.objects.filter(human_scanned=True).values_list("pk", flat=True)),
+            }
+            _loaded_at = time.monotonic()
+        return _pools
+
+def pick(human_scanned_only=False):
+    """Return a random poem, with its poet, or None if there are none
+
+    Parameters
+    ----------
+    human_scanned_only : bool
+        only pick from poems with a human scansion
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        # fetched each time, in case the pools were reloaded meanwhile
+        pool = _get_pools()[HUMAN_SCANNED if human_scanned_only else ALL]
+        with _lock:
+            poem_id = pool.choice()
+        if poem_id is None:
+            # perhaps only this process's ids are out of date
+            break
+        poem = Poem.objects.select_related("poet").filter(pk=poem_id).first()
+        if poem is None:
+            poem_deleted(poem_id)
+        elif human_scanned_only and not poem.human_scanned:
+            poem_saved(poem)
+        else:
+            return poem
+        # drop the id here too, should these pools no longer be current
+        with _lock:
+            pool.discard(poem_id)
+    # the pools are mostly stale; ask the database instead
+    poems = Poem.objects.select_related("poet")
+    if human_scanned_only:
+        poems = poems.filter(human_scanned=True)
+    return poems.order_by("?").first()
+
+def poem_saved(poem):
+    """Add a saved poem's id, moving it in or out of the human-scanned ids"""
+    with _lock:
+        if _pools is None:
+            return
+        _pools[ALL].add(poem.pk)
+        if "human_scanned" in poem.get_deferred_fields():
+            return
+        if poem.human_scanned:
+            _pools[HUMAN_SCANNED].add(poem.pk)
+        else:
+            _pools[HUMAN_SCANNED].discard(poem.pk)
+
+def poem_deleted(poem_id):
+    """Drop a deleted poem's id"""
+    with _lock:
+        if _pools is None:
+            return
+        for pool in _pools.values():
+            pool.discard(poem_id)
+
+def invalidate():
+    """Forget the ids so the next pick reloads them"""
+    global _pools
+    with _lock:
+        _pools = None
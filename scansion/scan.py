@@ -6,18 +6,32 @@ Functions
 ---------
 
 get_stats(word, confidence=False) : Return ratio to calculate scansion.
-poem_stats(poem) : Use get_stats on whole poem and return nested list.
+get_stats_many(words) : Return get_stats for many words from the lexicon.
+poem_stats(poem, tokens=None) : Use get_stats_many on whole poem and return nested list.
 original_scan(poem) : Scan by comparing each ratio to the next.
 house_robber_scan(poem) : Scan with solution to house robber problem
+house_robber_line(line) : Scan one line of stats for house_robber_scan
 simple_scan(poem) : Scan based on ratios with no comparisons.
-record(poem, scansion) : Record new user scansions in database.
+blank_scan(stats) : Mark every syllable unstressed.
+scan_all(poem, algorithms, tokens=None) : Scan with many algorithms sharing one stats pass.
+stanzas(lines) : Group lines of a poem into stanzas.
+scan_stanzas(lines, algorithms) : Scan a poem lazily, a stanza at a time.
+machine_scansions(poem, algorithms) : Return stored scansions, rescanning stale ones.
+stored_scansions(poem, algorithms) : Find stored scansions and which are stale.
+store_scansions(poem, stale, new_scans, version) : Save fresh scans of stale scansions.
+stale_poems(poems, algorithms) : Find poems in a batch needing a rescan.
+record(poem, scansion, tokens=None) : Record new user scansions in database.
 syllables(word) : Guess syllable count of word not in database.
 """
 
-from copy import copy
 from collections import Counter
+from django.db import transaction
+from django.db.models import F
 from . import parse
-from .models import Word, StressPattern
+from . import lexicon
+from . import estimator
+from . import metrics
+from .models import Word, StressPattern, PoemWord, HumanScansion, ScansionVote, MachineScansion
 
 def get_stats(word):
     """Get ratio of stressed scansions to unstressed for word's syllables.
@@ -33,65 +47,80 @@ def get_stats(word):
         stress ratio for each syllable of the word; 4 decimal places
         `?` if unknown
     """
-    try:
-        word_instance = Word.objects.get(word=word)
-        s = StressPattern.objects.filter(word=word_instance)
-        if s.exists():
-            stresses = parse.syllable_counter(s)[0]
-            return parse.calculate_ratios(stresses)
-        elif word_instance.syllables:
-            return ["?" for i in range(word_instance.syllables)]
-        else:
-            return ["?" for i in range(syllables(word))]           
-    except Word.DoesNotExist:
-        return ["?" for i in range(syllables(word))]
+    return get_stats_many([word])[word]
+
+def get_stats_many(words):
+    """Get stats for many words from the in-process lexicon snapshot.
+
+    Parameters
+    ----------
+    words : iterable of str
+        words cleaned with parse.clean(); duplicates are fine
+
+    Returns
+    -------
+    stats : dict
+        each distinct word mapped to what get_stats(word) would return
+    """
+    lex = lexicon.get_lexicon()
+    stats = {}
+    unknown = []
+    for word in set(words):
+        stats[word] = lex.stats(word)
+        if stats[word] is None:
+            unknown.append(word)
+    for word, count in zip(unknown, estimator.syllables_many(unknown)):
+        stats[word] = ["?" for i in range(count)]
+    return stats
 
-def poem_stats(poem):
+def poem_stats(poem, tokens=None):
     """Find stress ratio for each word in a poem.
 
     Parameters
     ----------
     poem : str
         poem to scan
+    tokens : list, optional
+        parse.tokenize(poem), if already at hand (see Poem.get_tokens)
    
     Returns
     -------
     stress_list : list
         list of lists of stress ratios
     """
-    # split poem into lines
-    cleaned_poem = parse.clean_poem(poem)
-    lines = parse.NEWLINE.split(cleaned_poem)
+    # split poem into lines of words without non-alphabetic characters and lowercase
+    if tokens is None:
+        tokens = parse.tokenize(poem)
+    word_lines = [[token.cleaned for token in line] for line in tokens]
+    # look up every distinct word in the poem at once
+    stats = get_stats_many(w for line in word_lines for w in line)
     poem_list = []
     # for each line get the list of stress probabilities (stressed / unstressed)
     # for each word and extend stress list with that sublist; for spaces, append a space
-    for line in lines:
-        words = line.split()
+    for words in word_lines:
         line_list = []
-        for word in words:
-            # get version of word without non-alphabetic characters and lowercase
-            w = parse.clean(word)
-            if w:
-                stress = get_stats(w)
-                line_list.extend(stress)
-                line_list.append(" ")
+        for w in words:
+            line_list.extend(stats[w])
+            line_list.append(" ")
         poem_list.append(line_list)
     return poem_list
 
-def original_scan(poem):
+def original_scan(poem, stats=None):
     """Scan poem by comparing each stress ratio to the next.
     
     Parameters
     ----------
     poem : str
         poem to scan
+    stats : list, optional
+        poem_stats(poem), if already found
         
     Return
     ------
     poem_scansion : str
         scansion with lines separated by newlines, words by spaces
     """
-    stress_list = poem_stats(poem)
+    stress_list = stats if stats is not None else poem_stats(poem)
     poem_scansion = []
     # for each line in this, compare the stress ratio for each word to the next
     for line in stress_list:
@@ -158,13 +187,15 @@ def original_scan(poem):
         poem_scansion.append(line_scansion)
     return "\n".join(poem_scansion)
 
-def house_robber_scan(poem):
+def house_robber_scan(poem, stats=None):
     """Scan poem by finding max sum of ratios with no adjacent stresses
     
     Parameters
     ----------
     poem : str
         poem to scan
+    stats : list, optional
+        poem_stats(poem), if already found
     
     Returns
     -------
@@ -172,63 +203,77 @@ def house_robber_scan(poem):
         scansion with lines separated by newlines, words by spaces        
     """
     # get stress pattern of poem
-    stress_list = poem_stats(poem)
-    poem_scansion = []
-    for line in stress_list:
-        # remove spaces and replace question marks with a guess of 0.3
-        # add each value to a tuple containing its index as the second value
-        spaceless_line = []
-        for i, value in enumerate(line):
-            if value != " ":
-                if value == "?":
-                    spaceless_line.append((0.3, i))
-                else:
-                    spaceless_line.append((value, i))
-        # initialize two lists to represent potential stress patterns for the lines
-        prev1 = []
-        prev2 = []
-        # iterate through spaceless line so constructed
-        for pair in spaceless_line:
-            tmp = copy(prev1)
-            # https://stackoverflow.com/questions/25047561/finding-a-sum-in-nested-list-using-a-lambda-function
-            # if the sum of stress values contained in prev1 is less than the sum
-            # of stress values in prev2 + the current stress value
-            # make prev1 a copy of prev2
-            if sum(p[0] for p in prev1) <= sum(p[0] for p in prev2) + pair[0]:
-                prev2.append(pair)
-                prev1 = copy(prev2)
-            # either way, make the previous prev1 prev2
-            prev2 = copy(tmp)
-        # iterate through original line, adding to a scansion
-        line_scansion = ""
-        for i, value in enumerate(line):
-            # carry spaces over into the scansion untouched
-            if value == " ":
-                line_scansion += value
-            # otherwise, if a given value is an index included in prev1,
-            # which is the "winner" for highest values
-            # make it stressed, and if it is not, make it unstressed
-            elif [pair for pair in prev1 if pair[1] == i]:
-                line_scansion += "/"
-            else:
-                line_scansion += "u"
-        poem_scansion.append(line_scansion)
-    return "\n".join(poem_scansion)
+    stress_list = stats if stats is not None else poem_stats(poem)
+    return "\n".join(house_robber_line(line) for line in stress_list)
+
+def house_robber_line(line):
+    """Scan one line of poem_stats output for house_robber_scan
 
-def simple_scan(poem):
+    Parameters
+    ----------
+    line : list
+        stress ratios for a line, `?` for unknown, `" "` after each word
+
+    Returns
+    -------
+    line_scansion : str
+        scansion of the line, words separated by spaces
+    """
+    # remove spaces and replace question marks with a guess of 0.3
+    values = [0.3 if value == "?" else value for value in line if value != " "]
+    # prev1 is the highest sum of stress values with no two adjacent
+    # up to the previous syllable, prev2 the same up to the one before;
+    # took records whether the best pattern ending at each syllable stresses it
+    prev1 = 0
+    prev2 = 0
+    took = []
+    for value in values:
+        # if stressing this syllable (and so not the previous one) does at
+        # least as well as leaving it unstressed, stress it
+        if prev1 <= prev2 + value:
+            prev1, prev2 = prev2 + value, prev1
+            took.append(True)
+        else:
+            prev2 = prev1
+            took.append(False)
+    # walk back from the last syllable through the winning pattern,
+    # skipping the neighbour of each stressed syllable
+    stressed = [False] * len(values)
+    i = len(values) - 1
+    while i >= 0:
+        if took[i]:
+            stressed[i] = True
+            i -= 2
+        else:
+            i -= 1
+    # carry spaces over into the scansion untouched
+    line_scansion = []
+    syllable = 0
+    for value in line:
+        if value == " ":
+            line_scansion.append(value)
+        else:
+            line_scansion.append(parse.STRESSED if stressed[syllable] else parse.UNSTRESSED)
+            syllable += 1
+    return "".join(line_scansion)
+
+def simple_scan(poem, stats=None):
     """Scan poem using ratios but not comparing them
     
     Parameters
     ----------
     poem : str
         poem to scan
+    stats : list, optional
+        poem_stats(poem), if already found
     
     Returns
     -------
     scansion : str
         scansion with lines separated by newlines, words by spaces
     """
-    stats = poem_stats(poem)
+    if stats is None:
+        stats = poem_stats(poem)
     poem_scansion = []
     for line in stats:
         line_scansion = ""
@@ -243,20 +288,23 @@ def simple_scan(poem):
         poem_scansion.append(line_scansion)
     return "\n".join(poem_scansion)
 
-def simple_scan_augmented(poem):
+def simple_scan_augmented(poem, stats=None):
     """Scan poem using ratios but not comparing them
     
     Parameters
     ----------
     poem : str
         poem to scan
+    stats : list, optional
+        poem_stats(poem), if already found
     
     Returns
     -------
     scansion : str
         scansion with lines separated by newlines, words by spaces
     """
-    stats = poem_stats(poem)
+    if stats is None:
+        stats = poem_stats(poem)
     poem_scansion = []
     for line in stats:
         line_scansion = ""
@@ -270,15 +318,218 @@ def simple_scan_augmented(poem):
                     line_scansion += "u"
         poem_scansion.append(line_scansion)
     return "\n".join(poem_scansion)
-def reconcile(authoritative, scansion_queryset, diffs):
+ALGORITHMS = {"House Robber Scan": house_robber_scan, "Original Scan": original_scan, "Simple Scan": simple_scan}
+
+BLANK_SLATE = "Blank Slate"
+
+def blank_scan(stats):
+    """Mark every syllable unstressed, going by poem_stats output alone"""
+    return "\n".join("".join(" " if value == " " else parse.UNSTRESSED for value in line)
+                     for line in stats)
+
+def scan_all(poem, algorithms, tokens=None):
+    """Scan poem with several algorithms, finding its stats only once
+
+    Parameters
+    ----------
+    poem : str
+        poem to scan
+    algorithms : iterable of str
+        names of algorithms in ALGORITHMS
+    tokens : list, optional
+        parse.tokenize(poem), if already at hand
+
+    Returns
+    -------
+    scansions : dict
+        each name mapped to its scansion, and BLANK_SLATE mapped to a
+        scansion with every syllable unstressed
+    """
+    with metrics.track(metrics.SCAN_SECONDS, metrics.SCAN_QUERIES, algorithm="stats"):
+        stats = poem_stats(poem, tokens)
+    syllables = metrics.syllable_count(stats)
+    scansions = {BLANK_SLATE: blank_scan(stats)}
+    for name in algorithms:
+        with metrics.track(metrics.SCAN_SECONDS, metrics.SCAN_QUERIES, algorithm=name):
+            scansions[name] = ALGORITHMS[name](poem, stats)
+        metrics.SCAN_SYLLABLES.observe(syllables, algorithm=name)
+    return scansions
+
+def stanzas(lines):
+    """Group lines of a poem into stanzas, dropping the blank lines between
+
+    Parameters
+    ----------
+    lines : iterable of str
+        lines of a poem, read lazily
+
+    Yields
+    ------
+    first : int
+        index of the stanza's first line in the poem
+    stanza : list of str
+        the stanza's lines
+    """
+    stanza = []
+    for i, line in enumerate(lines):
+        if line.strip():
+            if not stanza:
+                first = i
+            stanza.append(line)
+        elif stanza:
+            yield first, stanza
+            stanza = []
+    if stanza:
+        yield first, stanza
+
+def scan_stanzas(lines, algorithms):
+    """Scan a poem a stanza at a time, holding only one stanza at once
+
+    Every algorithm scans line by line, so the result is what scan_all
+    gives for the whole poem, cut into stanzas.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        lines of a poem, read lazily
+    algorithms : iterable of str
+        names of algorithms in ALGORITHMS
+
+    Yields
+    ------
+    first : int
+        index of the stanza's first line in the poem
+    stanza : list of str
+        the stanza's lines
+    scansions : dict
+        as scan_all returns, but each scansion a list of lines
+    """
+    algorithms = list(algorithms)
+    for first, stanza in stanzas(lines):
+        scansions = scan_all("\n".join(stanza), algorithms)
+        yield first, stanza, {name: scansion.split("\n") for name, scansion in scansions.items()}
+
+def machine_scansions(poem, algorithms):
+    """Return poem's MachineScansions, rescanning any that are stale
+
+    A stored scansion is reused as long as the poem's text and the
+    lexicon entries of its words are unchanged since it was made;
+    otherwise it is recomputed, with the others that are stale, and
+    saved.
+
+    Parameters
+    ----------
+    poem : Poem
+        poem whose scansions are wanted
+    algorithms : iterable of Algorithm
+        algorithms wanted, named as in ALGORITHMS
+
+    Returns
+    -------
+    scansions : list
+        MachineScansion for each algorithm, in the same order
+    """
+    scansions, stale = stored_scansions(poem, algorithms)
+    if stale:
+        # catch the snapshot up with other processes' changes first
+        version = lexicon.current_version()
+        lexicon.get_lexicon(version)
+        new_scans = scan_all(poem.poem, [s.algorithm.name for s in stale], poem.get_tokens())
+        store_scansions(poem, stale, new_scans, version)
+    return scansions
+
+def stored_scansions(poem, algorithms):
+    """Find poem's MachineScansions and which of them are stale
+
+    Returns
+    -------
+    scansions : list
+        MachineScansion for each algorithm, unsaved if there was none
+    stale : list
+        those of scansions that need rescanning, because the poem's
+        text or one of its words changed since they were made
+    """
+    version = poem.lexicon_version()
+    poem_hash = poem.get_hash()
+    stored = {s.algorithm_id: s for s in MachineScansion.objects.filter(poem=poem)}
+    scansions = []
+    stale = []
+    for algorithm in algorithms:
+        s = stored.get(algorithm.pk)
+        if s is None:
+            s = MachineScansion(poem=poem, algorithm=algorithm)
+        s.algorithm = algorithm
+        if not s.is_current(poem_hash, version):
+            stale.append(s)
+        scansions.append(s)
+    return scansions, stale
+
+def store_scansions(poem, stale, new_scans, version):
+    """Save scan_all output into stale MachineScansions"""
+    poem_hash = poem.get_hash()
+    for s in stale:
+        s.scansion = new_scans[s.algorithm.name]
+        s.poem_hash = poem_hash
+        s.lexicon_version = version
+        s.save()
+
+def stale_poems(poems, algorithms):
+    """Find which of a batch of poems have missing or stale MachineScansions
+
+    Does what stored_scansions does for each poem, with a few queries
+    for the whole batch.
+
+    Parameters
+    ----------
+    poems : list of Poem
+        poems to check, with their text loaded
+    algorithms : iterable of Algorithm
+        algorithms that should have current scansions
+
+    Returns
+    -------
+    ids : list of int
+        ids of the poems needing a rescan, in the order given
+    """
+    ids = [poem.pk for poem in poems]
+    # latest version of any word in each poem, as Poem.lexicon_version gives
+    versions = dict.fromkeys(ids, 0)
+    occurrences = {}
+    for poem_id, word in PoemWord.objects.filter(poem_id__in=ids).values_list("poem_id", "word").distinct():
+        occurrences.setdefault(word, []).append(poem_id)
+    words = list(occurrences)
+    for i in range(0, len(words), lexicon.BATCH_SIZE):
+        batch = words[i:i + lexicon.BATCH_SIZE]
+        for word, version in Word.objects.filter(word__in=batch).values_list("word", "lexicon_version"):
+            for poem_id in occurrences[word]:
+                versions[poem_id] = max(versions[poem_id], version)
+    stored = {(s.poem_id, s.algorithm_id): s for s in MachineScansion.objects.filter(poem_id__in=ids)
+              .only("poem_id", "algorithm_id", "poem_hash", "lexicon_version")}
+    stale = []
+    for poem in poems:
+        poem_hash = poem.get_hash()
+        for algorithm in algorithms:
+            s = stored.get((poem.pk, algorithm.pk))
+            if s is None or not s.is_current(poem_hash, versions[poem.pk]):
+                stale.append(poem.pk)
+                break
+    return stale
+
+def reconcile(authoritative, poem, diffs):
     """Reconcile new human scansion with others
     
+    Only the words in diffs are decided again, each by its
+    ScansionVotes: the variant with the most votes wins, and of
+    variants with equal votes, the one voted for most recently.
+
     Parameters
     ----------
     authoritative: str
         poem's authoritative scansion as string
-    scansion_queryset: Django queryset
-        other human scansion objects for that poem, incl new scansion
+    poem: Poem
+        poem whose human scansions, incl new scansion, have voted
+    diffs: list
+        (line, word) of each word where the new scansion differs
     
     Returns
     -------
@@ -288,27 +539,32 @@ def reconcile(authoritative, scansion_queryset, diffs):
     # differences will be ties; decide in favor of new;
     # if scansion and authoritative are identical,
     # (i.e. no diffs) return scansion
-    if scansion_queryset.count() <= 2 or not diffs:
+    if not diffs or HumanScansion.objects.filter(poem=poem).count() <= 2:
         return authoritative
-    else:
-        old_s_dicts = [parse.make_dict(hs.scansion) for hs in scansion_queryset]
-        auth_s_dict = parse.make_dict(authoritative)
-        for diff in diffs:
-            print(f"diff line {diff[0]} word {diff[1]}")
-            line_number = int(diff[0])
-            word_number = int(diff[1])
-            variants = [scan_dict[line_number][word_number] for scan_dict in old_s_dicts]
-            # https://stackoverflow.com/questions/23033625/sorting-counter-collection-in-python-with-secondary-term-tie-breaker
-            c = sorted(Counter(variants).most_common(), key = lambda x: (-x[1], variants[::-1].index(x[0])))
-            auth_s_dict[line_number][word_number] = c[0][0]
-        return parse.make_string(auth_s_dict)
-
-
-
-            
+    tokens = {(int(line), int(word)) for line, word in diffs}
+    winners = {}
+    votes = ScansionVote.objects.filter(poem=poem, line__in={line for line, word in tokens},
+                                        word__in={word for line, word in tokens})
+    for vote in votes:
+        token = (vote.line, vote.word)
+        if token in tokens:
+            best = winners.get(token)
+            if best is None or (vote.votes, vote.last_vote) > (best.votes, best.last_vote):
+                winners[token] = vote
+    auth_s_dict = parse.make_dict(authoritative)
+    for (line_number, word_number), vote in winners.items():
+        auth_s_dict[line_number][word_number] = vote.variant
+    return parse.make_string(auth_s_dict)
 
-def record(poem, scansion):
+def record(poem, scansion, tokens=None):
     """Record user scansions of individual words in database
+
+    Runs in one transaction with a handful of queries however long the
+    poem is: missing Words are bulk-created, StressPatterns seen before
+    gain popularity through F() increments grouped by amount, new ones
+    are bulk-created, and the touched Words' stress tallies are updated.
+    The transaction starts by claiming a lexicon version, which makes
+    concurrent submissions take turns, so none loses another's counts.
     
     Parameters
     ----------
@@ -316,42 +572,87 @@ def record(poem, scansion):
         poem that was scanned
     scansion : str
         scansion, words separated with spaces, lines with newlines
+    tokens : list, optional
+        parse.tokenize(poem), if already at hand
     """
-    # split both poem and scansion on spaces
-    p = parse.clean_poem(poem)
-    words = p.split()
-    cleaned_words = [parse.clean(word) for word in words]
+    # split both poem and scansion on spaces, skipping tokens like "&"
+    # that have no letters, as the scansion does
+    if tokens is None:
+        tokens = parse.tokenize(poem)
+    cleaned_words = [token.cleaned for line in tokens for token in line]
     scanned_words = scansion.strip().split()
-    # find each word in the database if it is there
-    for i, word in enumerate(cleaned_words):
-        w = Word.objects.filter(word=word)
-        if w.exists():
-            if w.count() > 1:
-                print("duplicate word")    
-            # see if any instances of the word have the user-inputted stress pattern
-            s = StressPattern.objects.filter(word=w[0], stresses=scanned_words[i])
-            if s.exists():
-                if s.count() > 1:
-                    print(f"{w[0]}: duplicate stress patterns")
-                    total_pop = sum(pattern.popularity for pattern in s)
-                    print(f"total popularity: {total_pop}")
-                    s[0].popularity = total_pop
-                    s[0].save()
-                    s_id = s[0].pk
-                    s.exclude(pk=s_id).delete()
-                    s = StressPattern.objects.filter(word=w[0], stresses=scanned_words[i])
-                    print(f"Dupes deleted, popularities added, count is now {s.count()}")
-                sp = s[0]
-                sp.popularity += 1
-                sp.save()
+    counts = Counter(zip(cleaned_words, scanned_words))
+    if not counts:
+        return
+    with transaction.atomic():
+        # mark the words changed in a new lexicon version; this waits
+        # for any other submission to commit before reading tallies
+        version = lexicon.next_version()
+        # find each word in the database if it is there
+        distinct = list({word for word, stresses in counts})
+        word_instances = {}
+        for i in range(0, len(distinct), lexicon.BATCH_SIZE):
+            batch = distinct[i:i + lexicon.BATCH_SIZE]
+            for w in Word.objects.select_for_update().filter(word__in=batch):
+                word_instances[w.word] = w
+        # create the rest, guessing syllables from their first scansion
+        new_words = {}
+        for word, stresses in counts:
+            if word not in word_instances and word not in new_words:
+                new_words[word] = Word(word=word, popularity=1, syllables=len(stresses))
+        if new_words:
+            # a concurrent submission may have just created some of them
+            Word.objects.bulk_create(new_words.values(), ignore_conflicts=True)
+            created = list(new_words)
+            for i in range(0, len(created), lexicon.BATCH_SIZE):
+                batch = created[i:i + lexicon.BATCH_SIZE]
+                for w in Word.objects.select_for_update().filter(word__in=batch):
+                    word_instances[w.word] = w
+
+        # see which stress patterns already exist for these words
+        patterns = {}
+        ids = [w.pk for w in word_instances.values()]
+        for i in range(0, len(ids), lexicon.BATCH_SIZE):
+            s = StressPattern.objects.filter(word__in=ids[i:i + lexicon.BATCH_SIZE]).order_by("pk")
+            for pattern in s:
+                patterns.setdefault(pattern.word_id, []).append(pattern)
+        existing = {(sp.word_id, sp.stresses): sp for word_patterns in patterns.values()
+                    for sp in word_patterns}
+        increments = {}
+        new_patterns = []
+        for (word, stresses), n in counts.items():
+            w = word_instances[word]
+            sp = existing.get((w.pk, stresses))
+            if sp:
+                sp.popularity += n
+                increments.setdefault(n, []).append(sp.pk)
             else:
-                sp = StressPattern(word=w[0], stresses=scanned_words[i], popularity=1)
-                sp.save()
-        else:
-            wd = Word(word=word, popularity=1, syllables=len(scanned_words[i]))
-            wd.save()
-            sp = StressPattern(word=wd, stresses=scanned_words[i], popularity=1)
-            sp.save()
+                sp = StressPattern(word=w, stresses=stresses, popularity=n)
+                patterns.setdefault(w.pk, []).append(sp)
+                new_patterns.append(sp)
+        for n, pks in increments.items():
+            StressPattern.objects.filter(pk__in=pks).update(popularity=F("popularity") + n)
+        StressPattern.objects.bulk_create(new_patterns)
+
+        # keep the words' stored tallies in step with their patterns
+        touched = {}
+        for (word, stresses), n in counts.items():
+            touched.setdefault(word, []).append((stresses, n))
+        for word, added in touched.items():
+            w = word_instances[word]
+            if w.dominant_syllables is not None and all(len(st) == w.dominant_syllables for st, n in added):
+                tallies = parse.decode_tallies(w.stress_tallies)
+                for stresses, n in added:
+                    parse.add_to_tallies(tallies, stresses, n)
+            else:
+                # a different syllable count may change which count is dominant
+                w.dominant_syllables, tallies = parse.stress_tallies(patterns[w.pk])
+            w.stress_tallies = parse.encode_tallies(tallies)
+            w.lexicon_version = version
+        updated = [word_instances[word] for word in touched]
+        Word.objects.bulk_update(updated, ["dominant_syllables", "stress_tallies", "lexicon_version"])
+    # bring this process's lexicon snapshot up to date with the new patterns
+    lexicon.store(updated)
 
 def syllables(word):
     """Guess syllable count of word not in database.
@@ -368,23 +669,6 @@ def syllables(word):
     
     See also
     --------
-    tests/test_scan.py to clarify regular expressions
+    estimator.estimate, which remembers recent words
     """   
-    cleaned_word = parse.clean(word)
-    compound = cleaned_word.split("-")
-    total_count = 0
-    for w in compound:
-        # get preliminary count by counting vowels or clusters thereof
-        count = parse.preliminary_syllable_count(w)
-        # increment count for all vowel clusters likely to be 2 syllables
-        count += parse.adjustment_for_two_syll_clusters(w)
-        # subtract 1 for every likely silent e
-        if parse.silent_final_e(w):
-            count -= 1
-        if parse.other_silent_e(w):
-            count -= 1
-            # words have at least one syllable
-        if count <= 0:
-            count = 1
-        total_count += count
-    return total_count
+    return estimator.estimate(word)
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Word, StressPattern, Poet, Poem, Algorithm, HumanScansion
+from . import contexts
+from . import metrics
+from . import navigation
+from . import random_poems
+
+@receiver(post_save, sender=StressPattern)
+@receiver(post_delete, sender=StressPattern)
+def stress_pattern_changed(sender, instance, raw=False, **kwargs):
+    """Rebuild the stress tallies of a changed pattern's word
+
+    Each rebuilt word gets a new lexicon version, so snapshots and
+    machine scansions catch up. scan.record keeps the tallies itself
+    and writes patterns in bulk, which sends no signals.
+    """
+    if raw:
+        # fixtures bring their words' tallies with them
+        return
+    word_ids = {instance.word_id, instance._loaded_word_id} - {None}
+    for word in Word.objects.filter(pk__in=word_ids):
+        word.rebuild_stress_tallies()
+    instance._loaded_word_id = instance.word_id
+
+@receiver(post_save, sender=Poet)
+@receiver(post_delete, sender=Poet)
+@receiver(post_save, sender=Poem)
+@receiver(post_delete, sender=Poem)
+@receiver(post_save, sender=HumanScansion)
+def poems_changed(sender, **kwargs):
+    """Forget cached menus when poets, poems or human scansions change"""
+    navigation.invalidate()
+    # again once committed, in case another request cached the old data meanwhile
+    transaction.on_commit(navigation.invalidate)
+
+@receiver(post_delete, sender=HumanScansion)
+def human_scansion_deleted(sender, instance, **kwargs):
+    """Take a deleted human scansion's votes back"""
+    poem = Poem.objects.filter(pk=instance.poem_id).first()
+    if poem is not None:
+        poem.rebuild_votes()
+
+@receiver(post_save, sender=Poem)
+@receiver(post_delete, sender=Poem)
+def poem_changed(sender, instance, **kwargs):
+    """Forget a changed poem's cached context"""
+    contexts.evict(instance.pk)
+
+@receiver(post_save, sender=Poem)
+def poem_saved(sender, instance, **kwargs):
+    """Offer a saved poem for random picks"""
+    random_poems.poem_saved(instance)
+
+@receiver(post_delete, sender=Poem)
+def poem_deleted(sender, instance, **kwargs):
+    """Stop offering a deleted poem for random picks"""
+    random_poems.poem_deleted(instance.pk)
+
+@receiver(post_save, sender=HumanScansion)
+@receiver(post_delete, sender=HumanScansion)
+def human_scansion_changed(sender, instance, **kwargs):
+    """Forget the cached context of a newly scanned poem"""
+    contexts.evict(instance.poem_id)
+
+@receiver(post_save, sender=Algorithm)
+@receiver(post_delete, sender=Algorithm)
+def algorithms_changed(sender, **kwargs):
+    """Forget every cached context, since each lists the algorithms"""
+    contexts.clear()
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """Count a new connection's queries for the request using it"""
+    metrics.count_request_queries(connection)
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+class TestRunner(DiscoverRunner):
+    """Run the tests with every cache in memory
+
+    The file-based caches are shared with the development server, so
+    menus and contexts built from the test database must not land in
+    them, and tests that clear a cache must not empty the real one.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        caches = {alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": alias,
+                          "TIMEOUT": config.get("TIMEOUT", 300)}
+                  for alias, config in settings.CACHES.items()}
+        self._caches = override_settings(CACHES=caches)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,161 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from scansion import lexicon
+from scansion import scan
+from scansion.management.commands import rescan
+from scansion.models import Word, StressPattern, Poet, Poem, PoemWord, Algorithm, MachineScansion
+
+class TestRescan(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        moon = Word.objects.create(word="moon", syllables=1)
+        StressPattern.objects.create(word=moon, stresses="/", popularity=3)
+        Algorithm.objects.create(name="Simple Scan")
+        Algorithm.objects.create(name="House Robber Scan", preferred=True)
+        for i in range(5):
+            Poem.objects.create(poem=f"moon squirrel\nthe moon {i}")
+
+    def setUp(self):
+        lexicon.invalidate()
+        directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(directory, "checkpoint.json")
+        self.lock = os.path.join(directory, "rescan.lock")
+
+    def rescan(self, *args):
+        call_command("rescan", "--workers", "1", "--chunk-size", "2",
+                     "--checkpoint", self.checkpoint, "--lock", self.lock, *args, stdout=StringIO())
+
+    def test_rescan(self):
+        # one stale scansion to update, the rest to create
+        poem = Poem.objects.order_by("pk").first()
+        algorithm = Algorithm.objects.get(name="Simple Scan")
+        MachineScansion.objects.create(poem=poem, algorithm=algorithm, scansion="x")
+        self.rescan()
+        self.assertEqual(MachineScansion.objects.count(), 10)
+        version = lexicon.current_version()
+        for s in MachineScansion.objects.select_related("poem", "algorithm"):
+            self.assertEqual(s.scansion, scan.ALGORITHMS[s.algorithm.name](s.poem.poem))
+            self.assertTrue(s.is_current(s.poem.get_hash(), version))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume(self):
+        ids = list(Poem.objects.order_by("pk").values_list("pk", flat=True))
+        with open(self.checkpoint, "w") as f:
+            json.dump({"last_id": ids[2], "lexicon_version": 0}, f)
+        self.rescan("--resume")
+        self.assertEqual(sorted(set(MachineScansion.objects.values_list("poem_id", flat=True))), ids[3:])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_stale(self):
+        self.rescan()
+        poem = Poem.objects.order_by("pk").last()
+        poem.poem = "squirrel"
+        poem.save()
+        MachineScansion.objects.update(scansion="kept")
+        self.rescan("--stale")
+        self.assertEqual(MachineScansion.objects.exclude(scansion="kept").count(), 2)
+        self.assertEqual(set(MachineScansion.objects.exclude(scansion="kept").values_list("poem_id", flat=True)),
+                         {poem.pk})
+
+    def test_already_running(self):
+        with rescan.acquire_lock(self.lock):
+            self.assertTrue(rescan.is_running(self.lock))
+            with self.assertRaises(CommandError):
+                self.rescan()
+        self.assertFalse(rescan.is_running(self.lock))
+        self.assertEqual(MachineScansion.objects.count(), 0)
+        self.rescan()
+        self.assertEqual(MachineScansion.objects.count(), 10)
+
+    def test_importable_before_setup(self):
+        # as "spawn" and "forkserver" workers import it
+        code = "import scansion.management.commands.rescan"
+        result = subprocess.run([sys.executable, "-c", code], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+class TestImportPoems(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Poet.objects.create(first_name="William", last_name="Shakespeare")
+        Algorithm.objects.create(name="Simple Scan")
+
+    def setUp(self):
+        lexicon.invalidate()
+        self.directory = tempfile.mkdtemp()
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_text(self):
+        path = self.write("poems.txt",
+                          "Title: A Sea Dirge\nPoet: William Shakespeare\nFull fathom five\n\nthy father lies\n%\n"
+                          "moon squirrel\n%\n%\n")
+        call_command("import_poems", path, "--poet", "Emily Dickinson", "--batch-size", "1", stdout=StringIO())
+        dirge, squirrel = Poem.objects.order_by("pk")
+        self.assertEqual(dirge.title, "A Sea Dirge")
+        self.assertEqual(dirge.poem, "Full fathom five\n\nthy father lies")
+        self.assertEqual(dirge.poet.last_name, "Shakespeare")
+        self.assertEqual(squirrel.poem, "moon squirrel")
+        self.assertEqual([dirge.display_title, squirrel.display_title], ["A Sea Dirge", "moon squirrel"])
+        self.assertEqual((squirrel.poet.first_name, squirrel.poet.last_name), ("Emily", "Dickinson"))
+        self.assertEqual(Poet.objects.count(), 2)
+
+    def test_jsonl_scan(self):
+        path = self.write("poems.jsonl",
+                          '{"poem": "moon squirrel", "poet": "William Shakespeare"}\n\n'
+                          '{"poem": "the moon", "last_name": "Keats"}\n')
+        call_command("import_poems", path, "--scan", stdout=StringIO())
+        self.assertEqual(Poem.objects.count(), 2)
+        self.assertEqual(Poet.objects.count(), 2)
+        self.assertEqual(PoemWord.objects.filter(word="moon").count(), 2)
+        for poem in Poem.objects.all():
+            s = poem.machinescansion_set.get()
+            self.assertEqual(s.scansion, scan.simple_scan(poem.poem))
+            self.assertTrue(s.is_current(poem.get_hash(), lexicon.current_version()))
+
+    def test_bad_jsonl(self):
+        path = self.write("poems.jsonl", '{"title": "no poem"}\n')
+        with self.assertRaises(CommandError):
+            call_command("import_poems", path, stdout=StringIO())
+
+class TestCheckLexicon(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        moon = Word.objects.create(word="moon", syllables=1)
+        StressPattern.objects.create(word=moon, stresses="/", popularity=3)
+        Word.objects.create(word="squirrel", syllables=2)
+        cls.poem = Poem.objects.create(poem="moon squirrel")
+        cls.algorithm = Algorithm.objects.create(name="Simple Scan")
+
+    def setUp(self):
+        lexicon.invalidate()
+
+    def test_rebuild(self):
+        scan.machine_scansions(self.poem, [self.algorithm])
+        # tallies gone wrong, as the scansion was made from
+        Word.objects.filter(word="moon").update(stress_tallies="0,3")
+        out = StringIO()
+        call_command("check_lexicon", stdout=out)
+        self.assertIn("1 of 2 words have stale tallies", out.getvalue())
+        s = MachineScansion.objects.get(poem=self.poem)
+        self.assertTrue(s.is_current(self.poem.get_hash(), self.poem.lexicon_version()))
+
+        call_command("check_lexicon", "--rebuild", stdout=StringIO())
+        self.assertEqual(Word.objects.get(word="moon").stress_tallies, "3,0")
+        self.assertFalse(s.is_current(self.poem.get_hash(), self.poem.lexicon_version()))
+        # and the snapshot rereads the word
+        lexicon.get_lexicon(lexicon.current_version())
+        self.assertEqual(lexicon.get_lexicon().stats("moon"), [4.0])
@@ -0,0 +1,41 @@
+from unittest import skipIf
+from django.test import TestCase
+from scansion.engine import np, scan_poems
+from scansion.scan import original_scan, house_robber_scan, simple_scan
+from scansion.models import Word, StressPattern
+from scansion import lexicon
+
+ALGORITHMS = {"House Robber Scan": house_robber_scan, "Original Scan": original_scan, "Simple Scan": simple_scan}
+
+@skipIf(np is None, "NumPy is not installed")
+class TestScanPoems(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for word, stresses, popularity in [("the", "u", 381), ("the", "/", 4),
+                                           ("moon", "/", 15), ("moon", "u", 1),
+                                           ("is", "u", 89), ("is", "/", 29),
+                                           ("water", "/u", 3), ("of", "u", 152),
+                                           ("night", "/", 12), ("night", "u", 2)]:
+            w, created = Word.objects.get_or_create(word=word)
+            StressPattern.objects.create(word=w, stresses=stresses, popularity=popularity)
+
+    def setUp(self):
+        lexicon.invalidate()
+
+    def test_matches_scan_functions(self):
+        poems = ["water moon",
+                 "is is",
+                 "squirrel",
+                 "the moon is\nthe squirrel",
+                 "moon water\n\nthe moon of is the night",
+                 "Wa'ter, moon--the night;\r\nis squirrel",
+                 ""]
+        results = scan_poems(poems, ALGORITHMS)
+        self.assertEqual(len(results), len(poems))
+        for poem, scansions in zip(poems, results):
+            for name, function in ALGORITHMS.items():
+                self.assertEqual(scansions[name], function(poem))
+
+    def test_other_algorithms(self):
+        reverse = lambda poem: poem[::-1]
+        self.assertEqual(scan_poems(["moon water"], {"Reverse": reverse}), [{"Reverse": "retaw noom"}])
@@ -0,0 +1,81 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from scansion import lexicon
+from scansion import metrics
+from scansion import scan
+from scansion.models import User, Poem, Algorithm
+
+class TestHistogram(TestCase):
+    def test_observe(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", (1, 5), ("view",))
+        metrics.REGISTRY.remove(histogram)
+        histogram.observe(0.5, view="a")
+        histogram.observe(1, view="a")
+        histogram.observe(7, view="a")
+        self.assertEqual(histogram.series(view="a"), ([2, 0, 1], 8.5, 3))
+        self.assertIsNone(histogram.series(view="b"))
+        self.assertEqual(histogram.render(), [
+            "# HELP test_seconds Test.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{view="a",le="1"} 2',
+            'test_seconds_bucket{view="a",le="5"} 2',
+            'test_seconds_bucket{view="a",le="+Inf"} 3',
+            'test_seconds_sum{view="a"} 8.5',
+            'test_seconds_count{view="a"} 3',
+        ])
+
+class TestCounter(TestCase):
+    def test_inc(self):
+        counter = metrics.Counter("test_total", "Test.", ("result",))
+        metrics.REGISTRY.remove(counter)
+        counter.inc(result="hit")
+        counter.inc(2, result="hit")
+        counter.inc(result="miss")
+        self.assertEqual(counter.value(result="hit"), 3)
+        self.assertEqual(counter.render(), [
+            "# HELP test_total Test.",
+            "# TYPE test_total counter",
+            'test_total{result="hit"} 3',
+            'test_total{result="miss"} 1',
+        ])
+
+class TestHooks(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Algorithm.objects.create(name="Simple Scan")
+        cls.poem = Poem.objects.create(poem="moon squirrel")
+        User.objects.create_user("staff", password="12345", is_staff=True)
+        User.objects.create_user("someone", password="12345")
+
+    def setUp(self):
+        lexicon.invalidate()
+        metrics.reset()
+
+    def test_scan_all(self):
+        scan.scan_all("moon squirrel", ["Simple Scan"])
+        self.assertEqual(metrics.SCAN_SECONDS.series(algorithm="stats")[2], 1)
+        self.assertEqual(metrics.SCAN_QUERIES.series(algorithm="Simple Scan")[2], 1)
+        self.assertEqual(metrics.SCAN_SYLLABLES.series(algorithm="Simple Scan")[1], 3)
+
+    def test_view(self):
+        self.client.get(reverse("poem", args=[self.poem.pk]))
+        counts, queries, count = metrics.VIEW_QUERIES.series(view="poem")
+        self.assertEqual(count, 1)
+        self.assertGreater(queries, 0)
+        self.assertEqual(metrics.CONTEXT_SECONDS.series()[2], 1)
+
+    async def test_async_view(self):
+        # the view queries in sync_to_async threads, not the event loop's
+        await self.async_client.get(reverse("poem", args=[self.poem.pk]))
+        counts, queries, count = metrics.VIEW_QUERIES.series(view="poem")
+        self.assertEqual(count, 1)
+        self.assertGreater(queries, 0)
+
+    def test_endpoint(self):
+        self.client.login(username="someone", password="12345")
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 302)
+        self.client.login(username="staff", password="12345")
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('scansion_view_seconds_count{view="metrics"} 1', response.content.decode())
@@ -1,5 +1,8 @@
 from django.test import TestCase
+from django.db import IntegrityError, transaction
 from scansion.models import User, Word, StressPattern, Poet, Poem, Algorithm, HumanScansion, MachineScansion
+from scansion import lexicon
+from scansion import parse
 
 class TestUser(TestCase):
     @classmethod
@@ -44,6 +47,45 @@ class TestWord(TestCase):
         self.assertEqual(w[0].part_of_speech, "n")
         self.assertEqual(w[0].__str__(), "rabbit")
 
+    def test_rebuild_stress_tallies(self):
+        w = Word.objects.get(word="rabbit")
+        StressPattern.objects.bulk_create([StressPattern(word=w, stresses="/u", popularity=2)])
+        version = w.lexicon_version
+        w.rebuild_stress_tallies()
+        w = Word.objects.get(word="rabbit")
+        self.assertEqual((w.dominant_syllables, w.stress_tallies), (2, "2,0;0,2"))
+        self.assertGreater(w.lexicon_version, version)
+
+    def test_stress_pattern_changes(self):
+        # as made through the admin, one pattern at a time
+        w = Word.objects.get(word="rabbit")
+        version = lexicon.current_version()
+        pattern = StressPattern.objects.create(word=w, stresses="/u", popularity=2)
+        self.assertEqual(Word.objects.get(word="rabbit").stress_tallies, "2,0;0,2")
+        self.assertGreater(lexicon.current_version(), version)
+        version = lexicon.current_version()
+        pattern = StressPattern.objects.get(pk=pattern.pk)
+        pattern.stresses = "u/"
+        pattern.save()
+        self.assertEqual(Word.objects.get(word="rabbit").stress_tallies, "0,2;2,0")
+        self.assertGreater(lexicon.current_version(), version)
+        pattern.delete()
+        self.assertEqual(Word.objects.get(word="rabbit").stress_tallies, "")
+
+    def test_stress_pattern_moved(self):
+        hare = Word.objects.create(word="hare")
+        pattern = StressPattern.objects.create(word=Word.objects.get(word="rabbit"), stresses="/u")
+        pattern = StressPattern.objects.get(pk=pattern.pk)
+        pattern.word = hare
+        pattern.stresses = "/"
+        pattern.save()
+        self.assertEqual(Word.objects.get(word="rabbit").stress_tallies, "")
+        self.assertEqual(Word.objects.get(word="hare").stress_tallies, "1,0")
+
+    def test_word_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Word.objects.create(word="rabbit")
+
 class TestStressPattern(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -60,6 +102,10 @@ class TestStressPattern(TestCase):
         self.assertTrue(s[1].is_valid())
         self.assertEqual(s[1].__str__(), "squirrel, /u, popularity: 1")
     
+    def test_stresspattern_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StressPattern.objects.create(word=Word.objects.get(word="squirrel"), stresses="/u")
+
     def test_stresspattern_invalid(self):
         s = StressPattern.objects.filter(word=Word.objects.get(word="squirrel"))
         self.assertFalse(s[0].is_valid())
@@ -130,6 +176,67 @@ u u /u u /u
         self.assertEqual(p[0].first_line(), "Full fathom five thy father lies:")
         self.assertEqual(p[0].__str__(), "A Sea Dirge by Shakespeare")
 
+    def test_word_index(self):
+        p = Poem.objects.get(poem="moon squirrel")
+        self.assertEqual(list(p.poemword_set.order_by("line", "position").values_list("word", "line", "position")),
+                         [("moon", 0, 0), ("squirrel", 0, 1)])
+        dirge = Poem.objects.get(title="A Sea Dirge")
+        self.assertEqual(dirge.poemword_set.get(line=7, position=4).word, "them")
+
+    def test_word_index_rebuilt(self):
+        p = Poem.objects.get(poem="moon squirrel")
+        p.poem = "Moon--\n\nthe moon"
+        p.save()
+        self.assertEqual(list(p.poemword_set.order_by("line", "position").values_list("word", "line", "position")),
+                         [("moon", 0, 0), ("the", 2, 0), ("moon", 2, 1)])
+
+    def test_word_index_kept(self):
+        p = Poem.objects.get(poem="moon squirrel")
+        ids = set(p.poemword_set.values_list("pk", flat=True))
+        p.title = "Moon"
+        p.save()
+        p = Poem.objects.only("title").get(pk=p.pk)
+        p.save()
+        self.assertEqual(set(p.poemword_set.values_list("pk", flat=True)), ids)
+
+    def test_display_title(self):
+        p = Poem.objects.get(poem="moon squirrel")
+        self.assertEqual(p.display_title, "moon squirrel")
+        self.assertEqual(Poem.objects.get(title="A Sea Dirge").display_title, "A Sea Dirge")
+        p.title = "Moon"
+        p.save(update_fields=["title"])
+        self.assertEqual(Poem.objects.get(pk=p.pk).display_title, "Moon")
+        p = Poem(poem="\n\n" + "moon " * 100)
+        p.save()
+        self.assertEqual(p.display_title, ("moon " * 100)[:255])
+
+    def test_human_scanned(self):
+        self.assertFalse(Poem.objects.get(poem="moon squirrel").human_scanned)
+        self.assertTrue(Poem.objects.get(title="A Sea Dirge").human_scanned)
+        p = Poem.objects.get(poem="moon squirrel")
+        p.scansion = "/ /u"
+        p.save(update_fields=["scansion"])
+        self.assertTrue(Poem.objects.get(pk=p.pk).human_scanned)
+        p = Poem.objects.only("title").get(pk=p.pk)
+        p.save()
+        self.assertTrue(Poem.objects.get(pk=p.pk).human_scanned)
+
+    def test_tokens(self):
+        p = Poem.objects.get(poem="moon squirrel")
+        self.assertEqual(parse.decode_tokens(p.tokens, p.poem), parse.tokenize(p.poem))
+        p.poem = "the moon"
+        self.assertEqual(p.get_tokens(), parse.tokenize("the moon"))
+        p.save()
+        p = Poem.objects.get(pk=p.pk)
+        self.assertEqual(parse.decode_tokens(p.tokens, p.poem), parse.tokenize("the moon"))
+
+    def test_lexicon_version(self):
+        p = Poem.objects.get(poem="moon squirrel")
+        self.assertEqual(p.lexicon_version(), 0)
+        Word.objects.create(word="squirrel", lexicon_version=3)
+        Word.objects.create(word="cat", lexicon_version=5)
+        self.assertEqual(p.lexicon_version(), 3)
+
 class TestAlgorithm(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -171,6 +278,25 @@ class TestHumanScansion(TestCase):
         hs = HumanScansion.objects.all()
         self.assertFalse(hs[1].is_valid())
 
+    def test_votes_counted(self):
+        poem = Poem.objects.get(poem="moon squirrel")
+        first, second = HumanScansion.objects.order_by("pk")
+        votes = {(v.line, v.word, v.variant): (v.votes, v.last_vote) for v in poem.scansionvote_set.all()}
+        self.assertEqual(votes, {(0, 0, "/"): (1, first.pk), (0, 1, "uu"): (1, first.pk),
+                                 (0, 0, "afds"): (1, second.pk)})
+        third = HumanScansion.objects.create(poem=poem, scansion="/ u/", user=User.objects.get(username="someone"))
+        self.assertEqual(poem.scansionvote_set.get(line=0, word=0, variant="/").votes, 2)
+        self.assertEqual(poem.scansionvote_set.get(line=0, word=0, variant="/").last_vote, third.pk)
+
+    def test_votes_taken_back(self):
+        poem = Poem.objects.get(poem="moon squirrel")
+        first, second = HumanScansion.objects.order_by("pk")
+        first.scansion = "u /"
+        first.save()
+        second.delete()
+        votes = {(v.line, v.word, v.variant): v.votes for v in poem.scansionvote_set.all()}
+        self.assertEqual(votes, {(0, 0, "u"): 1, (0, 1, "/"): 1})
+
 class TestMachineScansion(TestCase):
     @classmethod
     def setUpTestData(cls):
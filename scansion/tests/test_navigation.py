@@ -0,0 +1,63 @@
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.core.cache.backends.filebased import FileBasedCache
+from scansion import navigation
+from scansion.navigation import poet_names, poet_poems
+from scansion.models import Poet, Poem
+
+class TestNavigation(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shakespeare = Poet.objects.create(last_name="SHAKESPEARE")
+        Poet.objects.create(last_name="CARROLL")
+        Poem.objects.create(poem="Full fathom five thy father lies", poet=shakespeare, scansion="/ /u / / /u /")
+        Poem.objects.create(title="Sonnet", poem="Shall I compare thee", poet=shakespeare)
+        Poem.objects.create(poem="\n\nmoon squirrel")
+
+    def setUp(self):
+        navigation.invalidate()
+
+    def test_not_the_real_cache(self):
+        # the development server's menus live in a FileBasedCache
+        self.assertNotIsInstance(navigation._cache(), FileBasedCache)
+
+    def test_poet_names(self):
+        self.assertEqual(poet_names(True), ["CARROLL", "SHAKESPEARE"])
+        self.assertEqual(poet_names(False), ["SHAKESPEARE"])
+
+    def test_poet_poems(self):
+        shakespeare = Poet.objects.get(last_name="SHAKESPEARE")
+        poems = poet_poems(shakespeare)
+        self.assertEqual([title for pk, title in poems["human_scanned"]], ["Full fathom five thy father lies"])
+        self.assertEqual([title for pk, title in poems["computer_scanned"]], ["Sonnet"])
+        self.assertEqual(poet_poems(None)["computer_scanned"][0][1], "moon squirrel")
+
+    def test_poet_poems_ids(self):
+        poems = poet_poems(None)
+        self.assertEqual(poems["computer_scanned"], [[Poem.objects.get(poem="\n\nmoon squirrel").pk, "moon squirrel"]])
+        self.assertEqual(poems["human_scanned"], [])
+
+    def test_cached(self):
+        poet_names(False)
+        with self.assertNumQueries(0):
+            poet_names(False)
+
+    def test_invalidated_on_save(self):
+        self.assertEqual(poet_names(False), ["SHAKESPEARE"])
+        p = Poem.objects.create(poem="Twas brillig", poet=Poet.objects.get(last_name="CARROLL"))
+        p.scansion = "/ /u"
+        p.save()
+        self.assertEqual(poet_names(False), ["CARROLL", "SHAKESPEARE"])
+
+    def test_invalidated_in_every_process(self):
+        with tempfile.TemporaryDirectory() as location:
+            # two workers' handles on the same shared cache
+            worker, other_worker = FileBasedCache(location, {}), FileBasedCache(location, {})
+            with patch.object(navigation, "_cache", return_value=other_worker):
+                self.assertEqual(poet_names(False), ["SHAKESPEARE"])
+            with patch.object(navigation, "_cache", return_value=worker):
+                Poem.objects.create(poem="Twas brillig", poet=Poet.objects.get(last_name="CARROLL"), scansion="/ /u")
+            with patch.object(navigation, "_cache", return_value=other_worker):
+                self.assertEqual(poet_names(False), ["CARROLL", "SHAKESPEARE"])
@@ -1,5 +1,5 @@
 from django.test import TestCase
-from scansion.parse import clean_poem, clean, syllable_counter, calculate_ratios, preliminary_syllable_count, adjustment_for_two_syll_clusters, silent_final_e, other_silent_e
+from scansion.parse import clean_poem, clean, tokenize, encode_tokens, decode_tokens, make_dict_p, syllable_counter, calculate_ratios, preliminary_syllable_count, adjustment_for_two_syll_clusters, silent_final_e, other_silent_e
 from scansion.models import Word, StressPattern
 
 # This set of tests may be incomplete. I expect to add to it soon.
@@ -17,6 +17,26 @@ class TestCleanPoem(TestCase):
     def test_slashes_space(self):
         self.assertEqual(clean_poem("Squirrel / rodent"), "Squirrel rodent")
 
+class TestTokenize(TestCase):
+    def test_tokenize(self):
+        poem = "The--moon / is\r\n& a squirrel,\n"
+        lines = tokenize(poem)
+        self.assertEqual([[t.cleaned for t in line] for line in lines], [["the", "moon", "is"], ["a", "squirrel"], []])
+        self.assertEqual([[poem[t.start:t.end] for t in line] for line in lines], [["The", "moon", "is"], ["a", "squirrel,"], []])
+
+    def test_same_as_split(self):
+        poem = "Full fathom five — thy father lies:\n\nHark! now I hear them,--\rDing, dong, Bell."
+        lines = [[w for w in (clean(word) for word in line.split()) if w]
+                 for line in clean_poem(poem).splitlines()]
+        self.assertEqual([[t.cleaned for t in line] for line in tokenize(poem)], lines)
+
+    def test_decode(self):
+        poem = "Hark! now I hear them,--\nDing, dong, Bell."
+        self.assertEqual(decode_tokens(encode_tokens(tokenize(poem)), poem), tokenize(poem))
+
+    def test_make_dict_p(self):
+        self.assertEqual(make_dict_p("moon squirrel\n& moon\n"), {0: {0: "moon", 1: "squirrel"}, 1: {0: "moon"}})
+
 class TestClean(TestCase):
     def test_capitalization(self):
         self.assertEqual(clean("ThE"), "the")
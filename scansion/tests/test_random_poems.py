@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from scansion import random_poems
+from scansion.models import Poem
+
+class TestIdPool(TestCase):
+    def test_add_discard(self):
+        pool = random_poems.IdPool([1, 2, 3])
+        pool.add(3)
+        pool.add(4)
+        pool.discard(1)
+        pool.discard(5)
+        self.assertEqual(sorted(pool.ids), [2, 3, 4])
+        self.assertEqual({pool.ids[i]: i for i in range(len(pool))}, pool.positions)
+        self.assertIn(pool.choice(), [2, 3, 4])
+        self.assertIsNone(random_poems.IdPool().choice())
+
+class TestPick(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.unscanned = Poem.objects.create(poem="moon squirrel")
+        cls.scanned = Poem.objects.create(poem="the moon", scansion="u /")
+
+    def setUp(self):
+        random_poems.invalidate()
+        self.addCleanup(random_poems.invalidate)
+
+    def test_pick(self):
+        self.assertIn(random_poems.pick(), [self.unscanned, self.scanned])
+        self.assertEqual(random_poems.pick(human_scanned_only=True), self.scanned)
+
+    def test_one_query(self):
+        random_poems.pick()
+        with self.assertNumQueries(1):
+            poem = random_poems.pick()
+            poem.poet
+
+    def test_kept_up_to_date(self):
+        random_poems.pick()
+        self.unscanned.scansion = "/ /u"
+        self.unscanned.save()
+        self.scanned.delete()
+        pools = random_poems._get_pools()
+        self.assertEqual(pools[random_poems.ALL].ids, [self.unscanned.pk])
+        self.assertEqual(pools[random_poems.HUMAN_SCANNED].ids, [self.unscanned.pk])
+
+    def test_stale_ids_dropped(self):
+        random_poems.pick()
+        # a change that sends no signals, as from another process
+        Poem.objects.filter(pk=self.scanned.pk).update(human_scanned=False)
+        self.assertIsNone(random_poems.pick(human_scanned_only=True))
+        self.assertEqual(random_poems._get_pools()[random_poems.HUMAN_SCANNED].ids, [])
+
+    def test_empty_pool_falls_back_to_database(self):
+        Poem.objects.filter(pk=self.scanned.pk).update(human_scanned=False)
+        random_poems.pick(human_scanned_only=True)
+        self.assertEqual(len(random_poems._get_pools()[random_poems.HUMAN_SCANNED]), 0)
+        # scanned in another process, so these ids have not heard
+        Poem.objects.filter(pk=self.unscanned.pk).update(human_scanned=True)
+        self.assertEqual(random_poems.pick(human_scanned_only=True), self.unscanned)
+
+    def test_reloaded_while_picking(self):
+        random_poems.pick()
+        pools = random_poems._get_pools()
+        Poem.objects.filter(pk=self.scanned.pk).update(human_scanned=False)
+        # the pools are replaced just as the first id turns out stale
+        poem_saved = random_poems.poem_saved
+        def reload_then_save(poem):
+            random_poems.invalidate()
+            random_poems._get_pools()[random_poems.HUMAN_SCANNED].add(poem.pk)
+            poem_saved(poem)
+        with patch.object(random_poems, "poem_saved", reload_then_save):
+            self.assertIsNone(random_poems.pick(human_scanned_only=True))
+        self.assertNotIn(self.scanned.pk, pools[random_poems.HUMAN_SCANNED])
+
+    def test_falls_back_to_database(self):
+        # an id that is never dropped, as though its removals were lost
+        with patch.object(random_poems.IdPool, "choice", return_value=0), \
+                patch.object(random_poems.IdPool, "discard"), patch.object(random_poems, "poem_deleted"):
+            self.assertIn(random_poems.pick(), [self.unscanned, self.scanned])
@@ -1,7 +1,16 @@
+import gzip
+import json
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.core.cache.backends.filebased import FileBasedCache
 from django.test import TestCase
 from django.test import Client
 from django.urls import reverse
 
+from scansion import contexts, lexicon, metrics, scan
 from scansion.views import index, about, choose_poem, login, logout, register 
 from scansion.models import User, Word, StressPattern, Poet, Poem, Algorithm, HumanScansion, MachineScansion
 
@@ -65,4 +74,141 @@ class TestChoosePoem(TestCase):
         self.assertTemplateUsed("scansion/layout.html")
         self.assertTemplateUsed("scansion/choose_poem.html")
         self.assertEqual(response.context["human_list"].count(), 0)
-        self.assertEqual(response.context["computer_list"].count(), 1)
\ No newline at end of file
+        self.assertEqual(response.context["computer_list"].count(), 1)
+
+class TestAsyncViews(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Algorithm.objects.create(name="Simple Scan")
+        cls.poem = Poem.objects.create(poem="moon squirrel")
+
+    def setUp(self):
+        lexicon.invalidate()
+        # never empty the development server's cached contexts
+        self.assertNotIsInstance(contexts._cache(), FileBasedCache)
+        contexts.clear()
+        self.threads = []
+        scan_all = scan.scan_all
+        def record_thread(*args):
+            self.threads.append(threading.current_thread().name)
+            return scan_all(*args)
+        patcher = patch.object(scan, "scan_all", record_thread)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_poem(self):
+        response = await self.async_client.get(reverse("poem", args=[self.poem.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data["poem"]["poem"], "moon squirrel")
+        self.assertIn("Simple Scan", data["scansions"])
+        # scanned off the event loop, and stored for next time
+        self.assertTrue(self.threads[0].startswith("scan"))
+        await self.async_client.get(reverse("poem", args=[self.poem.pk]))
+        self.assertEqual(len(self.threads), 1)
+
+    async def test_poem_not_modified(self):
+        url = reverse("poem", args=[self.poem.pk])
+        response = await self.async_client.get(url)
+        etag = response["ETag"]
+        response = await self.async_client.get(url, **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        # a new human scansion changes the context
+        await sync_to_async(Poem.objects.filter(pk=self.poem.pk).update)(scansion="/ u/u")
+        response = await self.async_client.get(url, **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    async def test_poem_compact(self):
+        url = reverse("poem", args=[self.poem.pk])
+        data = json.loads((await self.async_client.get(url, {"compact": ""})).content)
+        self.assertEqual(data["poem"]["words"], [["moon", "squirrel"]])
+        self.assertNotIn("poem_dict", data["poem"])
+        self.assertIsNone(data["poem"]["authoritative"])
+        full = json.loads((await self.async_client.get(url)).content)
+        self.assertEqual(data["scansions"]["Simple Scan"]["scansion"],
+                         [list(words.values()) for words in full["scansions"]["Simple Scan"]["scansion"].values()])
+
+    async def test_poem_gzip(self):
+        self.poem.poem = "\n".join(["moon squirrel"] * 50)
+        await sync_to_async(self.poem.save)()
+        response = await self.async_client.get(reverse("poem", args=[self.poem.pk]), **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))["poem"]["id"], self.poem.pk)
+
+    async def test_poem_cached(self):
+        url = reverse("poem", args=[self.poem.pk])
+        hits = metrics.CONTEXT_CACHE.value(result="hit")
+        first = json.loads((await self.async_client.get(url)).content)
+        self.assertEqual(json.loads((await self.async_client.get(url)).content), first)
+        self.assertEqual(metrics.CONTEXT_CACHE.value(result="hit"), hits + 1)
+        # a human scansion evicts the poem's context
+        user = await sync_to_async(User.objects.create_user)("scanner", "", "12345")
+        await sync_to_async(HumanScansion.objects.create)(poem=self.poem, user=user, scansion="/ /u")
+        await self.async_client.get(url)
+        self.assertEqual(metrics.CONTEXT_CACHE.value(result="hit"), hits + 1)
+
+    async def test_own_poem(self):
+        response = await self.async_client.post(reverse("own_poem"), json.dumps({"poem": "moon squirrel"}),
+                                                content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(set(data["scansions"]), {scan.BLANK_SLATE, "Simple Scan"})
+        self.assertTrue(self.threads[0].startswith("scan"))
+
+    async def test_own_poem_catches_up(self):
+        await sync_to_async(lexicon.get_lexicon)()
+        # as recorded by another process, which leaves this snapshot alone
+        await sync_to_async(Word.objects.create)(word="moon", syllables=1, lexicon_version=1)
+        await self.async_client.post(reverse("own_poem"), json.dumps({"poem": "moon squirrel"}),
+                                     content_type="application/json")
+        self.assertIn("moon", lexicon.get_lexicon())
+
+class TestScanStream(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Algorithm.objects.create(name="Simple Scan")
+
+    def setUp(self):
+        lexicon.invalidate()
+
+    def test_scan_stream(self):
+        response = self.client.post(reverse("scan_stream"), "moon\r\nsquirrel\n\nthe moon\n",
+                                    content_type="text/plain")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([(r["line"], r["lines"]) for r in records], [(0, ["moon", "squirrel"]), (3, ["the moon"])])
+        self.assertEqual(records[1]["scansions"]["Simple Scan"], [scan.simple_scan("the moon")])
+        self.assertEqual(set(records[0]["scansions"]), {scan.BLANK_SLATE, "Simple Scan"})
+
+    def test_get(self):
+        self.assertEqual(self.client.get(reverse("scan_stream")).status_code, 405)
+
+class TestRescanAll(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="secret", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_get(self):
+        self.assertEqual(self.client.get(reverse("rescan_all")).status_code, 405)
+
+    @patch("scansion.views.subprocess.Popen")
+    def test_starts(self, popen):
+        popen.return_value.pid = 42
+        with patch("scansion.views.rescan.is_running", return_value=False):
+            response = self.client.post(reverse("rescan_all"))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content), {"status": "started", "pid": 42})
+        self.assertIn("--resume", popen.call_args[0][0])
+        popen.return_value.wait.assert_called_once()
+
+    @patch("scansion.views.subprocess.Popen")
+    def test_already_running(self, popen):
+        with patch("scansion.views.rescan.is_running", return_value=True):
+            response = self.client.post(reverse("rescan_all"))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.content), {"status": "running"})
+        popen.assert_not_called()
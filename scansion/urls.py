@@ -12,5 +12,7 @@ urlpatterns = [
     path("register", views.register, name="register"),
     path("rescan_poem/<int:id>", views.rescan_poem, name="rescan_poem"),
     path("rescan_all", views.rescan_all, name="rescan_all"),
-    path("own_poem", views.own_poem, name="own_poem")
+    path("own_poem", views.own_poem, name="own_poem"),
+    path("scan_stream", views.scan_stream, name="scan_stream"),
+    path("metrics", views.metrics_view, name="metrics")
 ]
\ No newline at end of file
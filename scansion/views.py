@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.shortcuts import HttpResponseRedirect, render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from django.urls import reverse
 # https://www.kite.com/python/docs/django.contrib.admindocs.views.staff_member_required
 from django.contrib.admin.views.decorators import staff_member_required
@@ -7,103 +10,156 @@ from django.contrib.auth import authenticate, login, logout
 from django.db.models import Max
 from django.db import IntegrityError
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.template.defaulttags import register
 
+import asyncio
+import contextvars
+import functools
+import hashlib
 import random
 import json
-from random import choice
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
 
 from .models import User, Word, StressPattern, Poet, Poem, Algorithm, HumanScansion, MachineScansion
 from . import scan
 from . import parse
+from . import lexicon
+from . import metrics
+from . import navigation
+from . import contexts
+from . import random_poems
+from .management.commands import rescan
 
-ALGORITHMS = {"House Robber Scan": scan.house_robber_scan, "Original Scan": scan.original_scan, "Simple Scan": scan.simple_scan}
+ALGORITHMS = scan.ALGORITHMS
 
-def generate_context(poem, promoted):
-    """generate context for React frontend"""
-    # get algorithms
-    algorithms = Algorithm.objects.all().order_by("-preferred")
-    
+# CPU-bound scans from async views run in these threads, so that a long
+# poem does not hold up the event loop and only a few scans run at once
+SCAN_WORKERS = 2
+scan_executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="scan")
+
+async def offload(function, *args):
+    """Run function in the scan executor and wait for it without blocking"""
+    loop = asyncio.get_running_loop()
+    # in this context, so that any queries count for the request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(scan_executor, functools.partial(context.run, function, *args))
+
+def is_promoted(user):
+    return user.is_authenticated and user.is_promoted()
+
+async def generate_context_async(poem, promoted, version=None):
+    """generate context for React frontend, rescanning in the scan executor
+
+    The poem's own part comes from the contexts cache while it is
+    current; version is content_version(poem), if already found.
+    """
+    with metrics.track(metrics.CONTEXT_SECONDS, None):
+        if version is None:
+            version = await sync_to_async(content_version)(poem)
+        serialized = await sync_to_async(contexts.get)(poem.pk, version)
+        if serialized is not None:
+            context = json.loads(serialized)
+        else:
+            algorithms = await sync_to_async(list)(Algorithm.objects.all().order_by("-preferred"))
+            machine_scansions, stale = await sync_to_async(scan.stored_scansions)(poem, algorithms)
+            if stale:
+                # load the snapshot here so the scan itself needs no queries
+                lexicon_version = await sync_to_async(lexicon.current_version)()
+                await sync_to_async(lexicon.get_lexicon)(lexicon_version)
+                new_scans = await offload(scan.scan_all, poem.poem, [s.algorithm.name for s in stale], poem.get_tokens())
+                await sync_to_async(scan.store_scansions)(poem, stale, new_scans, lexicon_version)
+            context = await sync_to_async(poem_context)(poem, algorithms, machine_scansions)
+            await sync_to_async(contexts.put)(poem.pk, version, json.dumps(context))
+        return await sync_to_async(add_menus)(context, poem, promoted)
+
+def poem_context(poem, algorithms, machine_scansions):
+    """Return the part of a poem's context that is the same for every user"""
     # create scansion consisting entirely of "u" to pass to template for React
-    blank_slate_to_be = ALGORITHMS[algorithms[0].name](poem.poem)
-    almost_blank_slate = blank_slate_to_be.replace(parse.STRESSED, parse.UNSTRESSED)
-    blank_slate = almost_blank_slate.replace(parse.UNKNOWN, parse.UNSTRESSED)
-    scansions = {"Blank Slate" : {
+    blank_slate = parse.blank_slate(machine_scansions[0].scansion)
+    scansions = {scan.BLANK_SLATE : {
         "about-algorithm": "",
         "scansion": parse.make_dict(blank_slate)
         }
     }
-    for algorithm in algorithms:
-        try:
-            s = MachineScansion.objects.get(poem=poem, algorithm=algorithm)
-        except MachineScansion.DoesNotExist:
-            new_scan = ALGORITHMS[algorithm.name](poem.poem)
-            s = MachineScansion(poem=poem, scansion=new_scan, algorithm=algorithm)
-            s.save()
+    for algorithm, s in zip(algorithms, machine_scansions):
         scansions[algorithm.name] = {
                 "about_algorithm": algorithm.about, 
                 "scansion": parse.make_dict(s.scansion)
         }
-    
-    pts = Poet.objects.all().order_by("last_name")
-    if promoted:
-        poets = [""] + [poet.last_name for poet in pts]
-    else:
-        poets = [""]
-        for poet in pts:
-            if Poem.objects.filter(poet=poet).exclude(scansion="").exists():
-                poets.append(poet.last_name)
 
-    if poem.title:
-        title = poem.title
-    else:
-        title = poem.first_line()
+    title = poem.display_title or poem.get_display_title()
     
     if poem.poet:
-        ps = Poem.objects.filter(poet=poem.poet)
         last_name = poem.poet.last_name
     else:
-        ps = Poem.objects.filter(poet__isnull=True)
         last_name = "Unknown"
-    poems_dict = {"human_scanned": [], "computer_scanned": []}
-    for p in ps:
-        if p.title:
-            t = p.title
-        else:
-            t = p.first_line()
-        poem_info = [p.pk, t]
-        if p.scansion:
-            poems_dict["human_scanned"].append(poem_info)
-        else:
-            poems_dict["computer_scanned"].append(poem_info)            
     return {
         "poem": {
             "id": poem.pk,
             "title" : title,
             "poem": poem.poem,
-            "poem_dict": parse.make_dict_p(poem.poem),
+            "poem_dict": parse.make_dict_p(poem.poem, poem.get_tokens()),
             "authoritative": parse.make_dict(poem.scansion),
             "poet": last_name
         }, 
         "scansions": scansions,
-        "poets": poets,
-        "poems": poems_dict
     }
 
+def add_menus(context, poem, promoted):
+    """Add the poet and poem menus, which depend on the user, to context"""
+    context["poets"] = [""] + navigation.poet_names(promoted)
+    context["poems"] = navigation.poet_poems(poem.poet)
+    return context
 
-# Create your views here.
-def index(request, id=""):
+def compact_context(context):
+    """Turn generate_context_async output into the compact payload
 
-    def get_random_poem(only_human_scanned=False):
-        if only_human_scanned:
-            poem_ids = list(Poem.objects.exclude(scansion="").values_list("id", flat=True))
-        else:
-            poem_ids = list(Poem.objects.values_list("id", flat=True))
-        if poem_ids:
-            chosen = choice(poem_ids)
-            return Poem.objects.get(id=chosen)
-        else:
-            tempestuous = """Full fathom five thy father lies:
+    Every make_dict and make_dict_p dict of {line: {word: token}} becomes
+    a list of lines, each a list of tokens; the poem's words are sent
+    once, as "words", and scansions line up with them by index.
+    """
+    def lines(d):
+        return [list(words.values()) for words in d.values()] if d else None
+    poem = dict(context["poem"])
+    poem["words"] = lines(poem.pop("poem_dict"))
+    poem["authoritative"] = lines(poem["authoritative"])
+    scansions = {name: {"about_algorithm": s.get("about_algorithm", ""), "scansion": lines(s["scansion"])}
+                 for name, s in context["scansions"].items()}
+    return dict(context, poem=poem, scansions=scansions)
+
+def content_version(poem):
+    """Return a hash of everything a poem's own context is built from
+
+    That is the poem and its human scansion, the lexicon its machine
+    scansions are current for, and the algorithms.
+    """
+    algorithms = Algorithm.objects.order_by("-preferred").values_list("pk", "name", "about")
+    parts = [poem.pk, poem.get_hash(), poem.title, poem.scansion, poem.poet_id,
+             poem.poet.last_name if poem.poet else None, poem.lexicon_version(), list(algorithms)]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+def poem_etag(version, promoted, compact):
+    """Return an ETag for the poem view's response, given content_version"""
+    parts = [version, navigation.version(), promoted, compact]
+    return '"' + hashlib.sha256(json.dumps(parts).encode()).hexdigest() + '"'
+
+def gzip_response(request, response):
+    """Compress response as GZipMiddleware does, if it is large enough"""
+    return GZipMiddleware(lambda request: response).process_response(request, response)
+
+# Create your views here.
+def get_random_poem(only_human_scanned=False):
+    poem = random_poems.pick(only_human_scanned)
+    if poem:
+        return poem
+    else:
+        tempestuous = """Full fathom five thy father lies:
 Of his bones are coral made;
 Those are pearls that were his eyes:
 Nothing of him that doth fade,
@@ -112,7 +168,7 @@ Into something rich and strange;
 Sea-nymphs hourly ring his knell:
 Hark! now I hear them,--
 Ding, dong, Bell."""
-            scansion = """u /u / u /u /
+        scansion = """u /u / u /u /
 / u / u /u /
 / u / u / u /
 /u / u / u /
@@ -122,68 +178,80 @@ u u /u u /u
 / u u / u
 / u /"""
 
-            p = Poem(title="A Sea Dirge",
-                        poem=tempestuous,
-                        scansion=scansion,
-                        poet=Poet.objects.get(last_name="SHAKESPEARE"))
-            p.save()
-            return p
+        p = Poem(title="A Sea Dirge",
+                    poem=tempestuous,
+                    scansion=scansion,
+                    poet=Poet.objects.get(last_name="SHAKESPEARE"))
+        p.save()
+        return p
 
-    if request.method == "PUT":
-        data = json.loads(request.body)
-        print(data)
-        # if the user has proven themselves, write their scansion to the database
-        if request.user.is_authenticated and request.user.is_promoted():
-            # update poem's scansion in the poem table and mark it human-scanned
-            s = parse.make_string(data["scansion"])
-            id = data["id"]
-            if id:
-                p = Poem.objects.get(pk=data["id"])
-                hs = HumanScansion(poem=p, scansion=s, user=request.user)
-                hs.save()
-                if p.scansion:
-                    h = HumanScansion.objects.filter(poem=p)
-                    p.scansion = scan.reconcile(p.scansion, h, data["diffs"])
-                    p.save()
-                else:
-                    p.scansion = s
-                    p.save()
-                      
-                p.human_scanned = True
+def index_put(request):
+    data = json.loads(request.body)
+    print(data)
+    # if the user has proven themselves, write their scansion to the database
+    if request.user.is_authenticated and request.user.is_promoted():
+        # update poem's scansion in the poem table and mark it human-scanned
+        s = parse.make_string(data["scansion"])
+        id = data["id"]
+        if id:
+            p = Poem.objects.get(pk=data["id"])
+            hs = HumanScansion(poem=p, scansion=s, user=request.user)
+            hs.save()
+            # saving a scansion marks the poem human-scanned
+            if p.scansion:
+                p.scansion = scan.reconcile(p.scansion, p, data["diffs"])
                 p.save()
-            # use record function from scan.py to update popularities of word scansions
-            # in Pronunciation instances
-            scan.record(data["poem"], s)
-            return HttpResponse()
-
-        # otherwise, score the user
-        elif request.user.is_authenticated:
-            u = request.user
-            u.score += int(data["score"])
-            u.save()
-            # promote the user if their score has reached 10 points
-            resp_data = {"score": u.score, "promoted": u.is_promoted()}
-            return JsonResponse(resp_data)
-        else:
-            return HttpResponse()
+            else:
+                p.scansion = s
+                p.save()
+        # use record function from scan.py to update popularities of word scansions
+        # in Pronunciation instances
+        tokens = p.get_tokens() if id and p.poem == data["poem"] else None
+        scan.record(data["poem"], s, tokens)
+        return HttpResponse()
+
+    # otherwise, score the user
+    elif request.user.is_authenticated:
+        u = request.user
+        u.score += int(data["score"])
+        u.save()
+        # promote the user if their score has reached 10 points
+        resp_data = {"score": u.score, "promoted": u.is_promoted()}
+        return JsonResponse(resp_data)
     else:
-        # get chosen poem or random poem
-        if id:
-            poem = Poem.objects.get(pk=id)
-        elif request.user.is_authenticated and request.user.is_promoted():
-            poem = get_random_poem()
-        else:
-            poem = get_random_poem(only_human_scanned=True)
+        return HttpResponse()
 
-       
+async def index(request, id=""):
+    if request.method == "PUT":
+        return await sync_to_async(index_put)(request)
+    promoted = await sync_to_async(is_promoted)(request.user)
+    # get chosen poem or random poem
+    if id:
+        poem = await sync_to_async(Poem.objects.select_related("poet").get)(pk=id)
+    else:
+        poem = await sync_to_async(get_random_poem)(only_human_scanned=not promoted)
+    ctxt = await generate_context_async(poem, promoted)
+    return await sync_to_async(render)(request, "scansion/index.html", {"ctxt": ctxt})
 
-        return render(request, "scansion/index.html", {
-            "ctxt" : generate_context(poem, request.user.is_authenticated and request.user.is_promoted())
-    })
-def poem(request, id):
-    poem = Poem.objects.get(pk=id)
-    data = generate_context(poem, request.user.is_authenticated and request.user.is_promoted())
-    return JsonResponse(data)
+async def poem(request, id):
+    """Return a poem's context as JSON, compact with ?compact
+
+    Repeat visits that send the ETag back get 304 Not Modified.
+    """
+    promoted = await sync_to_async(is_promoted)(request.user)
+    compact = "compact" in request.GET
+    poem = await sync_to_async(Poem.objects.select_related("poet").get)(pk=id)
+    version = await sync_to_async(content_version)(poem)
+    etag = await sync_to_async(poem_etag)(version, promoted, compact)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        data = await generate_context_async(poem, promoted, version)
+        response = JsonResponse(compact_context(data) if compact else data)
+        response["ETag"] = etag
+    # the answer depends on who asks, and must be revalidated every time
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Cookie"])
+    return gzip_response(request, response)
 
 def login_view(request):
     if request.method == "POST":
@@ -243,101 +311,77 @@ def about(request):
     return render(request, "scansion/about.html")
 
 def choose_poem(request, poet_name):
-    def get_data(poem_qset):
-        poem_data_list = []
-        for poem in poem_qset:
-            if poem.title:
-                title = poem.title
-            else:
-                title = poem.first_line()
-            poem_data_list.append([poem.pk, title])
-        return poem_data_list
     poet = Poet.objects.get(last_name=poet_name)
-    poems = Poem.objects.filter(poet=poet)
-    human_queryset = poems.exclude(scansion="").order_by("poet")
-    human_list = get_data(human_queryset)
-    computer_queryset = poems.filter(scansion="").order_by("poet")
-    computer_list = get_data(computer_queryset)
-    data = {"human_scanned": human_list, "computer_scanned": computer_list}
-    print(data)
+    data = navigation.poet_poems(poet)
     return JsonResponse(data)
 
 def rescan_poem(request, id):
     poem = Poem.objects.get(pk=id)
     algorithms = Algorithm.objects.all().order_by("-preferred")
-    blank_slate_to_be = ALGORITHMS[algorithms[0].name](poem.poem)
-    almost_blank_slate = blank_slate_to_be.replace(parse.STRESSED, parse.UNSTRESSED)
-    blank_slate = almost_blank_slate.replace(parse.UNKNOWN, parse.UNSTRESSED)
+    # stored scansions are only rescanned if the poem or lexicon changed
+    machine_scansions = scan.machine_scansions(poem, algorithms)
+    blank_slate = parse.blank_slate(machine_scansions[0].scansion)
     scansions = {
-        "Blank Slate" : {
+        scan.BLANK_SLATE : {
             "about-algorithm": "",
             "scansion": parse.make_dict(blank_slate)
           }
         }    
-    for algorithm in algorithms:
-        new_scan = ALGORITHMS[algorithm.name](poem.poem)
-        try:
-            s = MachineScansion.objects.get(poem=poem, algorithm=algorithm)
-            s.scasion = new_scan
-            s.save()
-        except MachineScansion.DoesNotExist:
-            s = MachineScansion(poem=poem, scansion=new_scan, algorithm=algorithm)
-            s.save()
+    for algorithm, s in zip(algorithms, machine_scansions):
         scansions[algorithm.name] = {
             "about-algorithm": algorithm.about, 
-            "scansion": parse.make_dict(new_scan)
+            "scansion": parse.make_dict(s.scansion)
         }
         
-        data = {
-            "scansions": scansions
-        }
+    data = {
+        "scansions": scansions
+    }
     return JsonResponse(data)
 
 @staff_member_required
+@require_POST
 def rescan_all(request):
-    poems = Poem.objects.all()
-    algorithms = Algorithm.objects.all()
-    for poem in poems:
-        for algorithm in algorithms:
-            new_scan = ALGORITHMS[algorithm.name](poem.poem)
-        try:
-            s = MachineScansion.objects.get(poem=poem, algorithm=algorithm)
-            s.scansion = new_scan
-            s.save()
-        except MachineScansion.DoesNotExist:
-            s = MachineScansion(poem=poem, scansion=new_scan, algorithm=algorithm)
-            s.save()
-    return HttpResponseRedirect(reverse("index"))    
-
-def own_poem(request):
+    # rescanning the corpus takes a while, so hand it to the rescan command
+    # in the background; --resume carries on from any interrupted run
+    if rescan.is_running():
+        return JsonResponse({"status": "running"}, status=409)
+    process = subprocess.Popen([sys.executable, str(settings.BASE_DIR / "manage.py"), "rescan", "--resume"],
+                               start_new_session=True)
+    # reap the command when it exits so it is not left a zombie
+    threading.Thread(target=process.wait, daemon=True).start()
+    return JsonResponse({"status": "started", "pid": process.pid}, status=202)
+
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+def own_poem_scansions(poem, algorithms):
+    """Scan poem with every algorithm for the frontend, including the all-"u" scansion"""
+    new_scans = scan.scan_all(poem, [algorithm.name for algorithm in algorithms])
+    scansions = {scan.BLANK_SLATE : {
+        "about-algorithm": "",
+        "scansion": parse.make_dict(new_scans[scan.BLANK_SLATE])
+      }
+    }
+    for algorithm in algorithms:
+        scansions[algorithm.name] = {
+                "about_algorithm": algorithm.about, 
+                "scansion": parse.make_dict(new_scans[algorithm.name])
+        }
+    return scansions
+
+async def own_poem(request):
         data = json.loads(request.body)
         poem = data["poem"]       
         # get algorithms
-        algorithms = Algorithm.objects.all().order_by("-preferred")
-        
-        # create scansion consisting entirely of "u" to pass to template for React
-        blank_slate_to_be = ALGORITHMS[algorithms[0].name](poem)
-        almost_blank_slate = blank_slate_to_be.replace(parse.STRESSED, parse.UNSTRESSED)
-        blank_slate = almost_blank_slate.replace(parse.UNKNOWN, parse.UNSTRESSED)
-        scansions = {"Blank Slate" : {
-            "about-algorithm": "",
-            "scansion": parse.make_dict(blank_slate)
-          }
-        }
-        for algorithm in algorithms:
-            new_scan = ALGORITHMS[algorithm.name](poem)
-            scansions[algorithm.name] = {
-                    "about_algorithm": algorithm.about, 
-                    "scansion": parse.make_dict(new_scan)
-            }
-        pts = Poet.objects.all().order_by("last_name")
-        if request.user.is_authenticated and request.user.is_promoted():
-            poets = [poet.last_name for poet in pts]
-        else:
-            poets = []
-            for poet in pts:
-                if Poem.objects.filter(poet=poet).exclude(scansion="").exists():
-                    poets.append(poet.last_name)
+        algorithms = await sync_to_async(list)(Algorithm.objects.all().order_by("-preferred"))
+        promoted = await sync_to_async(is_promoted)(request.user)
+        # load the snapshot here, caught up with other processes' changes,
+        # so the scan itself needs no queries
+        await sync_to_async(lambda: lexicon.get_lexicon(lexicon.current_version()))()
+        # pasted text can be any length, so scan it off the event loop
+        scansions = await offload(own_poem_scansions, poem, algorithms)
+        poets = await sync_to_async(navigation.poet_names)(promoted)
        
         data = {
             "poem": {
@@ -352,3 +396,18 @@ def own_poem(request):
            "poets": poets
         }
         return JsonResponse(data)
+
+@require_POST
+def scan_stream(request):
+    """Scan posted plain text a stanza at a time, answering in NDJSON
+
+    The body is read line by line as the response is sent, and each
+    stanza is written out as soon as it is scanned, so long texts never
+    sit in memory whole.
+    """
+    algorithms = [algorithm.name for algorithm in Algorithm.objects.all().order_by("-preferred")]
+    lexicon.get_lexicon(lexicon.current_version())
+    lines = (line.decode("utf-8").rstrip("\r\n") for line in request)
+    records = (json.dumps({"line": first, "lines": stanza, "scansions": scansions}) + "\n"
+               for first, stanza, scansions in scan.scan_stanzas(lines, algorithms))
+    return StreamingHttpResponse(records, content_type="application/x-ndjson")